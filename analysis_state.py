@@ -0,0 +1,374 @@
+import os
+import zlib
+from datetime import datetime, timezone
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from ingestion import (echo_date, echo_entries, echo_window_total, fetch_echo_window, fetch_journal_window, journal_texts,
+                       revalidate_user)
+from result_cache import fingerprint
+from observability import count_reads, get_logger, span
+from analyzer import (build_daily_aggregates, merge_daily_aggregates, prune_daily_aggregates,
+                      classify_daily_aggregates, current_model_version, window_start)
+
+log = get_logger('analysis_state')
+
+# Bump when the aggregate format or scoring changes so stored state gets rebuilt
+STATE_VERSION = 2
+
+# Conditional state writes retried after a concurrent live score changed the document
+STATE_SAVE_RETRIES = int(os.environ.get('STATE_SAVE_RETRIES', 5))
+
+
+def state_ref(db, user_id):
+    """Per-user document holding the persisted daily aggregates"""
+    return db.collection('users').document(user_id).collection('data').document('analysis_state')
+
+
+def empty_state():
+    return {
+        'version': STATE_VERSION,
+        'model_version': current_model_version(),
+        'journal_days': {},
+        'undated_journal_days': {},
+        'echo_days': {},
+        'live_days': {},
+        'last_journal_date': None,
+        'last_echo_timestamp': None,
+        'echo_mark_ids': [],
+        'echo_message_days': {},
+        'journal_entry_count': 0,
+        'echo_entry_count': 0,
+    }
+
+
+def load_state(db, user_id, fresh=False):
+    """Stored state, or a fresh one if missing, from an older format or from another model (or fresh=True).
+
+    Either way the document's update time and live days are kept under
+    'loaded' for save_state.
+    """
+    with span('state_load'):
+        doc = state_ref(db, user_id).get()
+    count_reads('state')
+    stored = doc.to_dict() if doc.exists else {}
+    valid = stored.get('version') == STATE_VERSION and stored.get('model_version') == current_model_version()
+    state = stored if valid and not fresh else empty_state()
+    state['loaded'] = {'update_time': doc.update_time if doc.exists else None,
+                       'live_days': stored.get('live_days') or {}}
+    return state
+
+
+def carry_live_days(kept, loaded, current):
+    """`kept` plus the live scores added between the `loaded` and `current` live days"""
+    live_days = {day: dict(values) for day, values in kept.items()}
+    for day, values in current.items():
+        before = loaded.get(day) or {}
+        added = {k: v - before.get(k, 0) for k, v in values.items()}
+        if added.get('sentiment_count', 0) > 0:
+            merge_daily_aggregates(live_days, {day: added})
+    return live_days
+
+
+def save_state(db, user_id, state):
+    """Replace the stored state; returns the live days it was stored with.
+
+    /score and the echo listener add to live_days without reading the
+    document, so the write only goes through if the document is unchanged
+    since load_state. Otherwise the live days scored in between are carried
+    over and the write retried, which can leave more live days than the state
+    was classified with.
+    """
+    loaded = state.pop('loaded', None) or {'update_time': None, 'live_days': {}}
+    live_days = state.get('live_days') or {}
+    ref = state_ref(db, user_id)
+    for attempt in range(STATE_SAVE_RETRIES):
+        data = {**state, 'live_days': live_days, 'updated_at': firestore.SERVER_TIMESTAMP}
+        try:
+            with span('state_save'):
+                if loaded['update_time'] is None:
+                    ref.create(data)
+                else:
+                    data.setdefault('live_levels', firestore.DELETE_FIELD)
+                    ref.update(data, option=db.write_option(last_update_time=loaded['update_time']))
+            state['live_days'] = live_days
+            return live_days
+        except (AlreadyExists, FailedPrecondition, NotFound):
+            if attempt == STATE_SAVE_RETRIES - 1:
+                raise
+        doc = ref.get()
+        count_reads('state')
+        current = (doc.to_dict() if doc.exists else {}).get('live_days') or {}
+        live_days = carry_live_days(live_days, loaded['live_days'], current)
+        if live_days and doc.exists and doc.get('live_levels'):
+            # Levels the live scores already materialized; latest_analysis holds them
+            state['live_levels'] = doc.get('live_levels')
+        loaded = {'update_time': doc.update_time if doc.exists else None, 'live_days': current}
+        log.info('state_save_retry', extra={'user_id': user_id, 'attempt': attempt + 1})
+
+
+def latest_ref(db, user_id):
+    """Small per-user document with only the newest result, so dashboards need one read"""
+    return db.collection('users').document(user_id).collection('data').document('latest_analysis')
+
+
+def load_latest(db, user_id):
+    with span('latest_load'):
+        doc = latest_ref(db, user_id).get()
+    count_reads('latest')
+    return doc.to_dict() if doc.exists else None
+
+
+def save_latest(db, user_id, result, computed_at=None):
+    """Materialize `result` (an analysis or a no_data body) as the user's latest analysis"""
+    with span('latest_save'):
+        latest_ref(db, user_id).set({
+            'result': result,
+            'model_version': result.get('model_version') or current_model_version(),
+            'computed_at': computed_at or datetime.now(timezone.utc),
+        })
+
+
+def latest_age(latest, now=None):
+    """Seconds since the record was computed; None if missing or from another model"""
+    if not latest or latest.get('model_version') != current_model_version() or not latest.get('computed_at'):
+        return None
+    return max(0.0, ((now or datetime.now(timezone.utc)) - latest['computed_at']).total_seconds())
+
+
+def _parse_date(date_key):
+    try:
+        return datetime.strptime(date_key, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def journal_fingerprint(texts):
+    """Cheap change marker for one day's journals (hashing is far cheaper than scoring)"""
+    return zlib.crc32('\x1f'.join(texts).encode('utf-8'))
+
+
+def update_journals(state, logs_data, today=None):
+    """Re-score only journal days that are new or changed since the last run.
+
+    Journals for past days can still be edited, so every stored day keeps a
+    fingerprint of its texts and is re-scored when that no longer matches.
+    Keys that are not dates land on "today" and are always re-scored, same as
+    in analyze_entries.
+    """
+    stored = state['journal_days']
+    cutoff = window_start(today)
+    journal_days, changed, undated = {}, [], []
+    journal_count = 0
+    newest = _parse_date(state['last_journal_date'])
+
+    for date_key, day_content in logs_data.items():
+        texts = journal_texts(day_content)
+        journal_count += len(texts)
+        if not texts:
+            continue
+
+        day = _parse_date(date_key)
+        if day is None:
+            undated.extend({'text': t, 'date': date_key, 'source': 'journal'} for t in texts)
+            continue
+        if newest is None or day > newest:
+            newest = day
+        if day < cutoff:
+            continue
+
+        fingerprint = journal_fingerprint(texts)
+        if date_key in stored and stored[date_key].get('fingerprint') == fingerprint:
+            journal_days[date_key] = stored[date_key]
+            continue
+        changed.extend({'text': t, 'date': date_key, 'source': 'journal'} for t in texts)
+        journal_days[date_key] = {'fingerprint': fingerprint}
+
+    for date_key, data in build_daily_aggregates(changed, today).items():
+        journal_days[date_key].update(data)
+
+    state['journal_days'] = journal_days
+    state['undated_journal_days'] = build_daily_aggregates(undated, today)
+    state['last_journal_date'] = str(newest) if newest else None
+    state['journal_entry_count'] = journal_count
+    return len(changed) + len(undated)
+
+
+def update_echo(state, echo_messages, today=None, rebuild=False):
+    """Score new echo messages and add them to the stored days.
+
+    `echo_messages` come from fetch_new_echo, so they are already user-sent,
+    carry id, text and timestamp, and exclude messages scored before. With
+    rebuild=True they are the whole window and replace the stored echo days.
+    Besides the high-water mark (and the ids of the messages on it), every
+    message is counted per day, text or not, so fetch_new_echo can tell when
+    the window no longer adds up.
+    """
+    if rebuild:
+        state.update(echo_days={}, echo_message_days={}, last_echo_timestamp=None, echo_mark_ids=[],
+                     echo_entry_count=0)
+    last_ts, mark_ids = state['last_echo_timestamp'], set(state['echo_mark_ids'])
+    message_days = state['echo_message_days']
+    for message in echo_messages:
+        timestamp = message['timestamp']
+        day = echo_date(timestamp)
+        message_days[day] = message_days.get(day, 0) + 1
+        if last_ts is None or timestamp > last_ts:
+            last_ts, mark_ids = timestamp, {message['id']}
+        elif timestamp == last_ts:
+            mark_ids.add(message['id'])
+    entries = list(echo_entries(echo_messages))
+
+    merge_daily_aggregates(state['echo_days'], build_daily_aggregates(entries, today))
+    state['last_echo_timestamp'] = last_ts
+    state['echo_mark_ids'] = sorted(mark_ids)
+    state['echo_entry_count'] += len(entries)
+    return len(entries)
+
+
+def stored_echo_messages(state, today=None):
+    """User echo messages in the window the state has seen (with or without text)"""
+    return sum(prune_daily_aggregates(state['echo_message_days'], today).values())
+
+
+def window_entry_count(state, today=None):
+    """Stored entries still inside the window, summed from the day aggregates.
+
+    The running journal/echo counters are change markers only: they never
+    drop the days that age out of the window.
+    """
+    return sum(day.get('sentiment_count', 0)
+               for name in ('journal_days', 'undated_journal_days', 'echo_days')
+               for day in prune_daily_aggregates(state.get(name) or {}, today).values())
+
+
+def state_fingerprint(state, today=None):
+    """Fingerprint of the windowed entry set the state was built from, plus the model version.
+
+    Journal days carry their own text fingerprints and echo messages are
+    identified by the high-water mark and running count, so nothing needs to be
+    re-read or re-scored to compute it.
+    """
+    journal_days = sorted((date_key, day.get('fingerprint')) for date_key, day in state['journal_days'].items())
+    undated = sorted((date_key, sorted(day.items())) for date_key, day in state['undated_journal_days'].items())
+    last_ts = state['last_echo_timestamp']
+    return fingerprint(
+        current_model_version(), str(window_start(today)), journal_days, undated,
+        last_ts.isoformat() if last_ts else None, state['echo_entry_count'], state['journal_entry_count'],
+        stored_echo_messages(state, today),
+    )
+
+
+def analysis_etag(db, user_id, today=None):
+    """ETag of the user's analysis from change markers alone (no entry bodies, no scoring).
+
+    Covers everything the result depends on: journal document update times,
+    the newest user echo message and their count in the window, the window
+    itself and the model. Read before the analysis, so a write racing with it
+    only ever makes the tag stale, never wrong. None if the markers cannot be
+    read (cached documents of the user are then dropped instead).
+    """
+    with span('etag'):
+        markers = revalidate_user(db, user_id, today)
+    if markers is None:
+        return None
+    journal_times, newest_echo, echo_count = markers
+    return fingerprint(
+        STATE_VERSION, current_model_version(), str(window_start(today)),
+        [t.isoformat() if t else None for t in journal_times],
+        newest_echo.isoformat() if newest_echo else None, echo_count,
+    )
+
+
+def fetch_logs(db, user_id, today=None):
+    """Windowed journal days as a dict (empty if the user has none)"""
+    return fetch_journal_window(db, user_id, today)
+
+
+def fetch_new_echo(db, user_id, state, today=None):
+    """(echo messages to add to the state, whether they replace its echo days).
+
+    Normally the messages at or after the high-water mark, minus those on it
+    that were already scored. A message backfilled below the mark (offline
+    sync, clock skew) or a deleted one never shows up that way, but it
+    changes the window's message count: when stored + new no longer equals
+    it, the whole window is returned for a rebuild.
+    """
+    last_ts, mark_ids = state['last_echo_timestamp'], set(state['echo_mark_ids'])
+    messages = [m for m in fetch_echo_window(db, user_id, today, after=last_ts)
+                if not (m['timestamp'] == last_ts and m['id'] in mark_ids)]
+    if stored_echo_messages(state, today) + len(messages) == echo_window_total(db, user_id, today):
+        return messages, False
+    log.info('echo_rebuild', extra={'user_id': user_id})
+    return fetch_echo_window(db, user_id, today), True
+
+
+def apply_updates(state, logs_data, echo_messages, today=None, echo_rebuild=False):
+    """Score fetched entries into the state and classify.
+
+    Either source may be None when its fetch failed; the stored days for it are
+    then kept as they were. Returns (results, state); `results` is None when the
+    user has no entries at all.
+    """
+    new_entries = 0
+    if logs_data is not None:
+        new_entries += update_journals(state, logs_data, today)
+    if echo_messages is not None:
+        new_entries += update_echo(state, echo_messages, today, rebuild=echo_rebuild)
+
+    # Messages scored live (see live_scoring.py) are now covered by the real
+    # data, unless a fetch failed and they may not be
+    if logs_data is not None and echo_messages is not None:
+        state['live_days'] = {}
+        state.pop('live_levels', None)
+    state['live_days'] = prune_daily_aggregates(state.get('live_days') or {}, today)
+
+    state['journal_days'] = prune_daily_aggregates(state['journal_days'], today)
+    state['echo_days'] = prune_daily_aggregates(state['echo_days'], today)
+    state['echo_message_days'] = prune_daily_aggregates(state['echo_message_days'], today)
+    state['fingerprint'] = state_fingerprint(state, today)
+
+    results = classify_state(state, today)
+    if results is None:
+        return None, state
+    results['new_entries_scored'] = new_entries
+    return results, state
+
+
+def classify_state(state, today=None):
+    """Classification over the stored and live days; None without stored entries in the window"""
+    total_entries = window_entry_count(state, today)
+    if not total_entries:
+        return None
+
+    daily_analysis = {}
+    for name in ('journal_days', 'undated_journal_days', 'echo_days', 'live_days'):
+        merge_daily_aggregates(daily_analysis, state[name])
+
+    results = classify_daily_aggregates(daily_analysis)
+    results['total_entries'] = total_entries
+    return results
+
+
+def run_incremental_analysis(db, user_id, full=False, today=None, state=None):
+    """Analyze a user by scoring only entries added since the last run.
+
+    Returns (results, state). `results` is None when the user has no entries at all.
+    With full=True the stored aggregates are ignored and rebuilt from scratch.
+    Pass `state` if the caller already loaded it.
+    """
+    if state is None:
+        state = load_state(db, user_id, fresh=full)
+
+    logs_data = echo_messages = None
+    echo_rebuild = False
+    try:
+        logs_data = fetch_logs(db, user_id, today)
+    except Exception as e:
+        log.warning('journal_fetch_failed', extra={'user_id': user_id, 'error': str(e)})
+
+    try:
+        echo_messages, echo_rebuild = fetch_new_echo(db, user_id, state, today)
+    except Exception as e:
+        log.warning('echo_fetch_failed', extra={'user_id': user_id, 'error': str(e)})
+
+    return apply_updates(state, logs_data, echo_messages, today, echo_rebuild)
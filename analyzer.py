@@ -1,50 +1,431 @@
+import contextvars
+import functools
+import hashlib
+import os
 import pickle
 import re
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import numpy as np
+import model_registry
+from observability import ENTRIES_SCORED, get_logger, span
 
-# Load models (Ensure these files are in your 'models' folder!)
-try:
-    with open('models/svm_model.pkl', 'rb') as f:
-        model = pickle.load(f)
-    with open('models/vectorizer.pkl', 'rb') as f:
-        vectorizer = pickle.load(f)
-except Exception as e:
-    print(f"⚠️ Model Warning: {e}. Ensure models/ folder is correct.")
+log = get_logger('analyzer')
 
 # Keywords for mental health detection
 DEPRESSION_KEYWORDS = ['sad', 'depressed', 'hopeless', 'worthless', 'empty', 'tired', 'exhausted', 'sleep', 'insomnia', 'suicide', 'death', 'end it', 'no point', 'give up', 'meaningless', 'numb', 'alone', 'isolated', 'crying', 'tears', 'hurt', 'pain', 'broken']
 ANXIETY_KEYWORDS = ['anxious', 'anxiety', 'worry', 'worried', 'nervous', 'panic', 'fear', 'scared', 'afraid', 'stress', 'stressed', 'overwhelmed', 'restless', 'tense', 'racing', 'cant breathe', 'heart racing']
 SUICIDAL_KEYWORDS = ['kill myself', 'end it all', 'suicide', 'want to die', 'better off dead', 'no reason to live', 'end my life', 'hang myself', 'overdose', 'jump off']
 
+URL_RE = re.compile(r'http\S+|www\S+|https\S+')
+NON_ALPHA_RE = re.compile(r'[^a-zA-Z\s]')
+
 def preprocess_text(text):
     """Clean text for model input"""
     text = str(text).lower()
-    text = re.sub(r'http\S+|www\S+|https\S+', '', text)
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    text = URL_RE.sub('', text)
+    text = NON_ALPHA_RE.sub('', text)
     return ' '.join(text.split())
 
+# ===== COMPACT LINEAR MODEL =====
+# TF-IDF + linear SVM scoring only needs the vocabulary, idf vector, coefficients and
+# intercept. train_model.py exports them into one flat file that is memory-mapped, so
+# gunicorn workers share the pages and startup does not import sklearn.
+#
+# Layout (little-endian): 64-byte header
+#   magic[8] | version[16] | n_slots u64 | n_features u64 | intercept f64 | classes i64[2]
+# followed by slot_hash u64[n_slots], slot_feature i64[n_slots], idf f64[n_features], coef f64[n_features].
+# The vocabulary is an open-addressing hash table (linear probing) keyed by a 64-bit
+# blake2b hash of each term; empty slots have feature -1.
+MODELS_DIR = model_registry.MODELS_DIR
+LINEAR_MODEL_PATH = os.path.join(MODELS_DIR, 'linear_model.bin')
+PICKLE_MODEL_PATH = os.path.join(MODELS_DIR, 'svm_model.pkl')
+PICKLE_VECTORIZER_PATH = os.path.join(MODELS_DIR, 'vectorizer.pkl')
+LINEAR_MAGIC = b'LINSVM01'
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', 'S16'), ('n_slots', '<u8'), ('n_features', '<u8'),
+                         ('intercept', '<f8'), ('classes', '<i8', (2,))])
+# sklearn's default token_pattern
+TOKEN_RE = re.compile(r'(?u)\b\w\w+\b')
+
+def term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+# Common terms repeat across entries; bounded so a worker's memory stays flat
+cached_term_hash = functools.lru_cache(maxsize=1 << 16)(term_hash)
+
+def model_version(*paths):
+    """Short checksum identifying a set of model files"""
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+def export_linear_model(vectorizer, model, path=LINEAR_MODEL_PATH, version=''):
+    """Write a fitted TfidfVectorizer + binary linear classifier in the compact format"""
+    if not hasattr(vectorizer, 'vocabulary_') or not hasattr(vectorizer, 'idf_'):
+        raise ValueError("Only a fitted TfidfVectorizer can be exported")
+    params = vectorizer.get_params()
+    supported = (params['analyzer'] == 'word' and params['lowercase'] and params['norm'] == 'l2'
+                 and params['use_idf'] and not params['sublinear_tf'] and not params['binary']
+                 and params['stop_words'] is None and params['tokenizer'] is None
+                 and params['preprocessor'] is None and params['strip_accents'] is None
+                 and params['token_pattern'] == TOKEN_RE.pattern
+                 and params['ngram_range'][0] == 1 and params['ngram_range'][1] <= 2)
+    if not supported or model.coef_.shape[0] != 1:
+        raise ValueError("Only word unigram/bigram TF-IDF with a binary linear model can be exported")
+
+    vocab = vectorizer.vocabulary_
+    n_features = len(vectorizer.idf_)
+    n_slots = 1
+    while n_slots < 2 * n_features:
+        n_slots *= 2
+    slot_hash = np.zeros(n_slots, dtype='<u8')
+    slot_feature = np.full(n_slots, -1, dtype='<i8')
+    seen = set()
+    for term, feature in vocab.items():
+        h = term_hash(term)
+        if h in seen:
+            raise ValueError(f"Hash collision in vocabulary at {term!r}")
+        seen.add(h)
+        slot = h & (n_slots - 1)
+        while slot_feature[slot] >= 0:
+            slot = (slot + 1) & (n_slots - 1)
+        slot_hash[slot] = h
+        slot_feature[slot] = feature
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = LINEAR_MAGIC
+    header['version'] = version.encode('ascii')
+    header['n_slots'] = n_slots
+    header['n_features'] = n_features
+    header['intercept'] = model.intercept_[0]
+    header['classes'] = model.classes_
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        for array in (slot_hash, slot_feature, np.asarray(vectorizer.idf_, dtype='<f8'),
+                      np.asarray(model.coef_[0], dtype='<f8')):
+            f.write(array.tobytes())
+
+class LinearScorer:
+    """Pure NumPy TF-IDF + linear SVM scorer over a memory-mapped export.
+
+    Reproduces TfidfVectorizer(ngram_range<=(1, 2), norm='l2') + LinearSVC.predict,
+    including the summation order, so labels match the sklearn pipeline exactly.
+    """
+
+    def __init__(self, path=LINEAR_MODEL_PATH):
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        header = np.frombuffer(data, dtype=HEADER_DTYPE, count=1)[0]
+        if header['magic'] != LINEAR_MAGIC:
+            raise ValueError(f"{path} is not a linear model export")
+        self.version = header['version'].decode('ascii')
+        self.n_features = int(header['n_features'])
+        self.intercept = float(header['intercept'])
+        self.classes = np.array(header['classes'])
+        n_slots = int(header['n_slots'])
+        self._mask = n_slots - 1
+
+        offset = HEADER_DTYPE.itemsize
+        def take(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes
+            return array
+        self.slot_hash = take('<u8', n_slots)
+        self.slot_feature = take('<i8', n_slots)
+        self.idf = take('<f8', self.n_features)
+        self.coef = take('<f8', self.n_features)
+
+    def _lookup(self, hashes):
+        """Vectorized probe of the vocabulary table; -1 for out-of-vocabulary terms"""
+        features = np.full(len(hashes), -1, dtype=np.int64)
+        slots = (hashes & np.uint64(self._mask)).astype(np.int64)
+        active = np.arange(len(hashes))
+        while active.size:
+            found = self.slot_feature[slots[active]]
+            occupied = found >= 0
+            hit = occupied & (self.slot_hash[slots[active]] == hashes[active])
+            features[active[hit]] = found[hit]
+            active = active[occupied & ~hit]
+            slots[active] = (slots[active] + 1) & self._mask
+        return features
+
+    def decision_function(self, texts):
+        lengths, all_terms = [], []
+        for text in texts:
+            tokens = TOKEN_RE.findall(text.lower())
+            all_terms += tokens
+            all_terms += [a + ' ' + b for a, b in zip(tokens, tokens[1:])]
+            lengths.append(2 * len(tokens) - 1 if tokens else 0)
+        hashes = np.fromiter(map(cached_term_hash, all_terms), dtype=np.uint64, count=len(all_terms))
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        features = self._lookup(hashes)
+        known = features >= 0
+
+        # One entry per (row, feature), sorted like a CSR matrix with sorted indices
+        keys, counts = np.unique(rows[known] * self.n_features + features[known], return_counts=True)
+        row_of, feature_of = keys // self.n_features, keys % self.n_features
+        values = counts * self.idf[feature_of]
+        norms = np.sqrt(np.bincount(row_of, weights=values * values, minlength=len(texts)))
+        values = values / norms[row_of]
+        scores = np.bincount(row_of, weights=values * self.coef[feature_of], minlength=len(texts))
+        return scores + self.intercept
+
+    def predict(self, texts):
+        return self.classes[(self.decision_function(texts) > 0).astype(np.int64)]
+
+    def warm(self):
+        """Fault every page of the mapped arrays in now rather than on the first requests"""
+        return int(self.slot_hash.sum()) + int(self.slot_feature.sum()) + float(self.idf.sum() + self.coef.sum())
+
+class SklearnScorer:
+    """The pickled TfidfVectorizer + LinearSVC"""
+
+    def __init__(self, model_path=PICKLE_MODEL_PATH, vectorizer_path=PICKLE_VECTORIZER_PATH):
+        with open(model_path, 'rb') as f:
+            self.model = pickle.load(f)
+        with open(vectorizer_path, 'rb') as f:
+            self.vectorizer = pickle.load(f)
+        self.version = model_version(model_path, vectorizer_path)
+
+    def predict(self, texts):
+        return self.model.predict(self.vectorizer.transform(texts))
+
+def load_scorer(model_format='auto', directory=MODELS_DIR):
+    """'linear' = memory-mapped export, 'pickle' = sklearn objects, 'auto' = linear if exported"""
+    linear_path = os.path.join(directory, 'linear_model.bin')
+    if model_format == 'linear' or (model_format == 'auto' and os.path.exists(linear_path)):
+        return LinearScorer(linear_path)
+    return SklearnScorer(os.path.join(directory, 'svm_model.pkl'), os.path.join(directory, 'vectorizer.pkl'))
+
+# ===== ACTIVE MODEL =====
+# The served model is one immutable ActiveModel swapped in atomically, so a reload never
+# leaves a half-loaded scorer visible. Requests and job chunks pin the model they started
+# with (pinned_model), so one analysis never mixes two versions. The version identifies the
+# model everywhere: cached results, stored aggregates and every analysis result.
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'auto')
+WARMUP_TEXTS = ['i feel calm and happy today', 'so tired and hopeless, nothing matters anymore',
+                'worried and stressed about work', 'had a nice walk with friends']
+
+class ModelUnavailable(RuntimeError):
+    """No sentiment model is loaded"""
+
+ActiveModel = namedtuple('ActiveModel', 'scorer version manifest')
+
+_active_model = None
+_swap_lock = threading.Lock()
+_pinned_model = contextvars.ContextVar('pinned_model', default=None)
+
+def load_model(version=None, model_format=MODEL_FORMAT):
+    """A registry version (default: the registry's CURRENT), else the legacy files in models/"""
+    version = version or model_registry.current_version()
+    if version is None:
+        scorer = load_scorer(model_format)
+        return ActiveModel(scorer, scorer.version, None)
+    manifest = model_registry.verify(version)
+    scorer = load_scorer(model_format, model_registry.version_dir(version))
+    return ActiveModel(scorer, manifest['version'], manifest)
+
+def warm_model(model):
+    """Touch the model's pages and code paths so the first requests after a swap are not slower"""
+    if hasattr(model.scorer, 'warm'):
+        model.scorer.warm()
+    model.scorer.predict([preprocess_text(t) for t in WARMUP_TEXTS])
+
+def swap_model(model):
+    """Make `model` the one new work uses; work already running keeps its pinned model"""
+    global _active_model
+    with _swap_lock:
+        previous, _active_model = _active_model, model
+    return previous
+
+def reload_model(version=None):
+    """Load, verify and warm a model outside the request path, then swap it in"""
+    model = load_model(version)
+    warm_model(model)
+    swap_model(model)
+    log.info('model_swapped', extra={'model_version': model.version})
+    return model
+
+def active_model():
+    """The model this request/job chunk pinned, else the one currently served (None if none loaded)"""
+    return _pinned_model.get() or _active_model
+
+def current_model_version():
+    model = active_model()
+    return model.version if model else None
+
+def pin_model():
+    """Pin the currently served model for the rest of this context; returns a token for unpin_model"""
+    return _pinned_model.set(_active_model)
+
+def unpin_model(token):
+    _pinned_model.reset(token)
+
+@contextmanager
+def pinned_model():
+    """Use one model for everything inside the block, even if another is swapped in meanwhile"""
+    token = _pinned_model.set(active_model())
+    try:
+        yield _pinned_model.get()
+    finally:
+        _pinned_model.reset(token)
+
+def require_model():
+    model = active_model()
+    if model is None:
+        raise ModelUnavailable("No sentiment model is loaded")
+    return model
+
+try:
+    reload_model()
+except Exception as e:
+    log.warning('model_load_failed', extra={'error': str(e), 'hint': 'Ensure models/ folder is correct'})
+
+def _sentiment(model, clean):
+    if not clean: return 1
+    try:
+        return model.scorer.predict([clean])[0]
+    except Exception as e:
+        log.warning('sentiment_failed', extra={'model_version': model.version, 'error': str(e)})
+        return 0 # Default to negative if the model fails on this text, to be safe
+
 def get_sentiment(text):
-    """Get sentiment: 0=negative, 1=positive using your SVM"""
+    """Get sentiment: 0=negative, 1=positive using your SVM (ModelUnavailable if no model is loaded)"""
     clean = preprocess_text(text)
     if not clean: return 1
+    return _sentiment(require_model(), clean)
+
+def get_sentiments(texts):
+    """Batch version of get_sentiment: one transform + one predict for all texts"""
+    cleaned = [preprocess_text(t) for t in texts]
+    sentiments = np.ones(len(cleaned), dtype=np.int64)  # empty text counts as positive, same as get_sentiment
+    rows = [i for i, clean in enumerate(cleaned) if clean]
+    if not rows:
+        return sentiments
+    model = require_model()
     try:
-        vec = vectorizer.transform([clean])
-        return model.predict(vec)[0]
-    except:
-        return 0 # Default to negative if model fails to be safe
+        sentiments[rows] = model.scorer.predict([cleaned[i] for i in rows])
+    except Exception:
+        # Batch failed: score row by row so only the bad rows fall back to negative
+        for i in rows:
+            sentiments[i] = _sentiment(model, cleaned[i])
+    return sentiments
 
 def count_keywords(text, keywords):
     return sum(1 for kw in keywords if kw in text.lower())
 
-def analyze_entries(entries):
-    if not entries:
-        return {'depression_level': 'none', 'anxiety_level': 'none', 'risk_level': 'low', 'insights': ['Not enough data']}
+def _trie_regex(keywords):
+    """Build a prefix-factored alternation so each position is checked against a trie, not every keyword"""
+    trie = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Greedy optional: prefer the longest keyword, fall back to the shorter one ending here
+        return '(?:' + body + ')?' if '' in node else body
+
+    # Zero-width lookahead so overlapping keywords ('racing' inside 'heart racing') are all seen
+    return re.compile('(?=(' + emit(trie) + '))')
+
+class KeywordMatcher:
+    """Counts keywords for several categories in one scan of the text.
+
+    Counts are identical to calling count_keywords once per category: each keyword
+    counts once if it appears anywhere in the lowercased text as a plain substring.
+    """
+
+    def __init__(self, categories):
+        self.categories = list(categories)
+        index = {name: i for i, name in enumerate(self.categories)}
+        self._keyword_categories = {}
+        for name, keywords in categories.items():
+            for kw in keywords:
+                self._keyword_categories.setdefault(kw, []).append(index[name])
+        keywords = [kw for kw in self._keyword_categories if kw]
+        self._pattern = _trie_regex(keywords)
+        # Every keyword that matches at a position is a prefix of the longest match there
+        self._prefixes = {kw: [p for p in keywords if kw.startswith(p)] for kw in keywords}
+        # '' is a substring of everything, so count_keywords always counts it
+        self._always = self._keyword_categories.get('', [])
+
+    def count(self, text):
+        """Return a tuple of keyword counts, in category order"""
+        found = set()
+        for match in self._pattern.finditer(text.lower()):
+            found.update(self._prefixes[match.group(1)])
+        counts = [0] * len(self.categories)
+        for idx in self._always:
+            counts[idx] += 1
+        for kw in found:
+            for idx in self._keyword_categories[kw]:
+                counts[idx] += 1
+        return tuple(counts)
+
+KEYWORD_MATCHER = KeywordMatcher({
+    'dep': DEPRESSION_KEYWORDS,
+    'anx': ANXIETY_KEYWORDS,
+    'sui': SUICIDAL_KEYWORDS,
+})
+
+def count_keyword_categories(text):
+    """Return (depression, anxiety, suicidal) keyword counts from a single scan"""
+    return KEYWORD_MATCHER.count(text)
+
+# ===== SCORING =====
+# score_texts is the CPU-bound unit of work (cleaning, model, keyword matching). It runs
+# in the calling thread unless an executor is installed (see scoring.py), e.g. a process
+# pool so large batches are not serialized on the GIL.
+_scoring_executor = None
+
+def set_scoring_executor(executor):
+    """Default executor for score_all (None = score in the calling thread)"""
+    global _scoring_executor
+    previous, _scoring_executor = _scoring_executor, executor
+    return previous
+
+def score_texts(texts):
+    """(sentiments int64[n], keyword counts int64[n, 3]) for texts, in this thread"""
+    with span('sentiment'):
+        sentiments = get_sentiments(texts)
+    with span('keywords'):
+        keywords = np.array([count_keyword_categories(t) for t in texts], dtype=np.int64).reshape(-1, 3)
+    return sentiments, keywords
+
+def score_all(texts, executor=None):
+    """score_texts through `executor`, else the installed default"""
+    executor = executor or _scoring_executor
+    return executor.score(texts) if executor is not None else score_texts(texts)
+
+# DSM-V symptom window, in days
+WINDOW_DAYS = 14
+
+def new_day_aggregate():
+    """Empty per-day aggregate (stored as plain ints so it can be persisted as-is)"""
+    return {'sentiment_sum': 0, 'sentiment_count': 0, 'dep_keywords': 0, 'anx_keywords': 0, 'sui_keywords': 0}
+
+def window_start(today=None):
+    """First date still inside the DSM-V window"""
+    today = today or datetime.now().date()
+    return today - timedelta(days=WINDOW_DAYS)
 
+def build_daily_aggregates(entries, today=None, executor=None):
+    """Score entries and sum them up per day, skipping anything outside the window"""
     # CRASH FIX: Use current date for items like 'Chat/Echo' that don't have a real YYYY-MM-DD
-    today = datetime.now().date()
-    two_weeks_ago = today - timedelta(days=14)
+    today = today or datetime.now().date()
+    two_weeks_ago = window_start(today)
     daily_analysis = {}
+    windowed = []
 
     for entry in entries:
         date_str = entry.get('date', 'Chat/Echo')
@@ -61,21 +442,51 @@ def analyze_entries(entries):
         # Skip if older than 2 weeks (DSM-V window)
         if entry_date < two_weeks_ago:
             continue
-        
+        windowed.append((date_str, text))
+
+    # Score every windowed entry in a single vectorizer/model pass
+    sentiments, keyword_counts = score_all([text for _, text in windowed], executor)
+    ENTRIES_SCORED.inc(len(windowed))
+
+    for (date_str, _), sentiment, (dep, anx, sui) in zip(windowed, sentiments.tolist(), keyword_counts.tolist()):
         if date_str not in daily_analysis:
-            daily_analysis[date_str] = {'sentiments': [], 'dep_keywords': 0, 'anx_keywords': 0, 'sui_keywords': 0}
+            daily_analysis[date_str] = new_day_aggregate()
         
-        daily_analysis[date_str]['sentiments'].append(get_sentiment(text))
-        daily_analysis[date_str]['dep_keywords'] += count_keywords(text, DEPRESSION_KEYWORDS)
-        daily_analysis[date_str]['anx_keywords'] += count_keywords(text, ANXIETY_KEYWORDS)
-        daily_analysis[date_str]['sui_keywords'] += count_keywords(text, SUICIDAL_KEYWORDS)
+        day = daily_analysis[date_str]
+        day['sentiment_sum'] += int(sentiment)
+        day['sentiment_count'] += 1
+        day['dep_keywords'] += dep
+        day['anx_keywords'] += anx
+        day['sui_keywords'] += sui
+
+    return daily_analysis
+
+def merge_daily_aggregates(into, other):
+    """Add the per-day aggregates of `other` into `into` (in place)"""
+    for date_str, data in other.items():
+        day = into.setdefault(date_str, new_day_aggregate())
+        for key in day:
+            day[key] += data.get(key, 0)
+    return into
 
+def prune_daily_aggregates(daily_analysis, today=None):
+    """Drop days that have left the window"""
+    cutoff = window_start(today)
+    return {date_str: data for date_str, data in daily_analysis.items()
+            if datetime.strptime(date_str, '%Y-%m-%d').date() >= cutoff}
+
+def classify_daily_aggregates(daily_analysis):
+    """Turn per-day aggregates into depression/anxiety/risk levels"""
+    with span('classify'):
+        return _classify(daily_analysis)
+
+def _classify(daily_analysis):
     # Calculate metrics
     negative_days, anxiety_days, suicidal_days = 0, 0, 0
     total_dep_score, total_anx_score = 0, 0
     
     for date, data in daily_analysis.items():
-        avg_sent = np.mean(data['sentiments']) if data['sentiments'] else 1
+        avg_sent = data['sentiment_sum'] / data['sentiment_count'] if data['sentiment_count'] else 1
         if avg_sent < 0.5 or data['dep_keywords'] >= 3:
             negative_days += 1
             total_dep_score += data['dep_keywords']
@@ -85,6 +496,11 @@ def analyze_entries(entries):
         if data['sui_keywords'] > 0:
             suicidal_days += 1
 
+    return classify_day_counts(negative_days, anxiety_days, suicidal_days,
+                               total_dep_score, total_anx_score, len(daily_analysis))
+
+def classify_day_counts(negative_days, anxiety_days, suicidal_days, total_dep_score, total_anx_score, total_days):
+    """Levels from the per-window day counts (shared by the single-user and batch paths)"""
     # Classification logic (Your Original Logic)
     dep_lvl = 'none'
     if suicidal_days >= 2 or (negative_days >= 10 and total_dep_score >= 15): dep_lvl = 'severe'
@@ -107,6 +523,77 @@ def analyze_entries(entries):
         'anxiety_level': anx_lvl,
         'risk_level': risk,
         'negative_days': negative_days,
-        'total_days_analyzed': len(daily_analysis),
+        'total_days_analyzed': total_days,
         'crisis_detected': suicidal_days > 0
-    }
\ No newline at end of file
+    }
+
+def no_entries_result():
+    return {'depression_level': 'none', 'anxiety_level': 'none', 'risk_level': 'low', 'insights': ['Not enough data']}
+
+def analyze_entries(entries, executor=None, today=None):
+    if not entries:
+        return no_entries_result()
+    return classify_daily_aggregates(build_daily_aggregates(entries, today, executor=executor))
+
+@functools.lru_cache(maxsize=4096)
+def parse_entry_date(date_str):
+    """YYYY-MM-DD key as a date, None for keys like 'Chat/Echo' (a cohort shares few distinct dates)"""
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def analyze_entries_batch(entries_by_user, today=None, executor=None):
+    """analyze_entries for many users at once: {user_id: entries} -> {user_id: result}.
+
+    Distinct texts across the whole cohort are scored in one model pass and
+    every (user, day) is summed with np.bincount over a group index, so the
+    cost follows the total number of entries, not the number of users.
+    Results are identical to calling analyze_entries per user.
+    """
+    today = today or datetime.now().date()
+    cutoff = window_start(today)
+    user_ids = list(entries_by_user)
+    day_index, text_index = {}, {}
+    row_user, row_day, row_text = [], [], []
+
+    for u, user_id in enumerate(user_ids):
+        for entry in entries_by_user[user_id]:
+            date_str = entry.get('date', 'Chat/Echo')
+            entry_date = parse_entry_date(date_str)
+            if entry_date is None:
+                entry_date, date_str = today, str(today)
+            if entry_date < cutoff:
+                continue
+            row_user.append(u)
+            row_day.append(day_index.setdefault(date_str, len(day_index)))
+            row_text.append(text_index.setdefault(entry.get('text', ''), len(text_index)))
+
+    sentiments, keywords = score_all(list(text_index), executor)
+    ENTRIES_SCORED.inc(len(row_text))
+
+    # Columns per (user, day) group
+    row_text = np.asarray(row_text, dtype=np.int64)
+    group_keys, row_group = np.unique(np.asarray(row_user, dtype=np.int64) * max(1, len(day_index))
+                                      + np.asarray(row_day, dtype=np.int64), return_inverse=True)
+    n_groups = len(group_keys)
+    sentiment_sum = np.bincount(row_group, weights=sentiments[row_text], minlength=n_groups)
+    sentiment_count = np.bincount(row_group, minlength=n_groups)
+    dep, anx, sui = (np.bincount(row_group, weights=keywords[row_text, k], minlength=n_groups) for k in range(3))
+
+    # Same per-day rules as classify_daily_aggregates, then per-user totals
+    negative = (sentiment_sum / np.maximum(sentiment_count, 1) < 0.5) | (dep >= 3)
+    anxious = anx >= 2
+    group_user = group_keys // max(1, len(day_index))
+    per_user = lambda weights=None: np.bincount(group_user, weights=weights, minlength=len(user_ids))
+    negative_days, dep_scores = per_user(negative), per_user(dep * negative)
+    anxiety_days, anx_scores = per_user(anxious), per_user(anx * anxious)
+    suicidal_days, total_days = per_user(sui > 0), per_user()
+
+    with span('classify'):
+        return {
+            user_id: classify_day_counts(int(negative_days[u]), int(anxiety_days[u]), int(suicidal_days[u]),
+                                         int(dep_scores[u]), int(anx_scores[u]), int(total_days[u]))
+            if entries_by_user[user_id] else no_entries_result()
+            for u, user_id in enumerate(user_ids)
+        }
@@ -1,38 +1,172 @@
 import os
 import json
-from flask import Flask, jsonify, request
+import asyncio
+import contextvars
+import gzip
+import hmac
+import functools
+import itertools
+import math
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Flask, Response, g, jsonify, request
 from flask_cors import CORS
 import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime
-from analyzer import analyze_entries
+import analyzer
+import model_registry
+from analyzer import (ModelUnavailable, analyze_entries, analyze_entries_batch, current_model_version,
+                      pinned_model, window_start)
+from analysis_state import (analysis_etag, apply_updates, classify_state, fetch_logs, fetch_new_echo, latest_age,
+                            load_latest, load_state, run_incremental_analysis, save_latest, save_state)
+from queries import echo_counts, user_ids_page
+from ingestion import (MARKER_READ_THREADS, end_request_cache, fetch_cache, fetch_journal_window, revalidate_user,
+                       start_request_cache, user_entries)
+from workers import bounded_map
+from result_cache import ResultCache, fingerprint as entries_fingerprint
+from live_scoring import message_date, score_new_message
+from jobs import JobRunner, job_progress, make_job_store
+from scoring import make_scoring_executor
+from batch_writes import ResultWriter
+from observability import (REQUEST_SECONDS, configure_logging, get_logger, render_metrics,
+                           request_timings, server_timing_header, span, start_request_timings)
 
-app = Flask(__name__)
-CORS(app)
+api = Blueprint('api', __name__)
+log = get_logger('app')
 
 # Get port from environment (Render sets this automatically)
 port = int(os.environ.get('PORT', 7860))
+# Parallel Firestore fetches for /debug/analyze-all
+ANALYZE_ALL_WORKERS = int(os.environ.get('ANALYZE_ALL_WORKERS', 8))
+# Users scored per analyze_entries_batch call in /debug/analyze-all
+ANALYZE_BATCH_USERS = int(os.environ.get('ANALYZE_BATCH_USERS', 64))
+# Page size for /debug/users
+USERS_PAGE_SIZE = int(os.environ.get('USERS_PAGE_SIZE', 100))
+MAX_USERS_PAGE_SIZE = 1000
+# In-process analysis result cache
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 4096))
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 600))
+# Threads doing the deferred Firestore writes of /analyze-async
+BACKGROUND_WRITE_WORKERS = int(os.environ.get('BACKGROUND_WRITE_WORKERS', 4))
+# Background jobs: 'sqlite' survives restarts and is shared by all workers, 'memory' is per process.
+# The file is created on first use; point JOB_STORE_PATH at a volume to keep jobs across containers
+JOB_STORE = os.environ.get('JOB_STORE', 'sqlite')
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', os.path.join(tempfile.gettempdir(), 'jobs.sqlite3'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+# /analysis/<user_id> serves the materialized result while it is younger than this (seconds)
+LATEST_MAX_AGE = int(os.environ.get('LATEST_MAX_AGE', 3600))
+# Seconds between background refresh-latest sweeps (0 = only when POSTed, e.g. by a cron)
+LATEST_SWEEP_INTERVAL = int(os.environ.get('LATEST_SWEEP_INTERVAL', 0))
+# Persisted cohort mode (?persist=1): analysis_results written per WriteBatch of this many
+# documents (max 500), with this many retries of a failed commit
+RESULTS_BATCH_SIZE = int(os.environ.get('RESULTS_BATCH_SIZE', 500))
+RESULTS_WRITE_RETRIES = int(os.environ.get('RESULTS_WRITE_RETRIES', 3))
+# Where scoring runs: 'thread' (calling thread) or 'process' (pool of SCORING_PROCESSES,
+# default one per core, for batches of at least SCORING_MIN_BATCH texts)
+SCORING_BACKEND = os.environ.get('SCORING_BACKEND', 'thread')
+SCORING_PROCESSES = int(os.environ.get('SCORING_PROCESSES', 0)) or None
+SCORING_MIN_BATCH = int(os.environ.get('SCORING_MIN_BATCH', 2000))
+# gzip for the large debug payloads: bodies under GZIP_MIN_BYTES are sent as is
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+# Seconds between checks of the model registry's CURRENT pointer (0 = no watcher)
+MODEL_WATCH_INTERVAL = int(os.environ.get('MODEL_WATCH_INTERVAL', 30))
+# Shared secret for the /admin endpoints (X-Admin-Token header); unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 # Use the absolute path to be 100% sure
 key_path = os.path.join(os.path.dirname(__file__), 'serviceAccountKey.json')
 
-if not firebase_admin._apps:
-    try:
-        # Debug: Check if the file is valid JSON before loading
-        with open(key_path) as f:
-            test_load = json.load(f)
-            print(f"✅ Key File is valid JSON. Project: {test_load.get('project_id')}")
-            
-        cred = credentials.Certificate(key_path)
-        firebase_admin.initialize_app(cred)
-        print("✅ Firebase initialized successfully!")
-    except Exception as e:
-        print(f"❌ Firebase Init Failed: {e}")
+analyzer.set_scoring_executor(make_scoring_executor(SCORING_BACKEND, SCORING_PROCESSES, SCORING_MIN_BATCH))
 
-db = firestore.client()
-        
+# Firestore client. Created per process by init_db(): under gunicorn that happens in
+# each worker after fork, since gRPC channels must not be shared across a fork.
+db = None
+db_error = 'Firestore client not initialized'
+_db_lock = threading.Lock()
+
+def init_db(client=None):
+    """Initialize Firebase and create the Firestore client (or install the given one)"""
+    global db, db_error
+    with _db_lock:
+        if client is not None:
+            db, db_error = client, None
+            return db
+        try:
+            if not firebase_admin._apps:
+                # Debug: Check if the file is valid JSON before loading
+                with open(key_path) as f:
+                    test_load = json.load(f)
+                    log.info('key_file_valid', extra={'project': test_load.get('project_id')})
+                    
+                cred = credentials.Certificate(key_path)
+                firebase_admin.initialize_app(cred)
+                log.info('firebase_initialized')
+            db, db_error = firestore.client(), None
+        except Exception as e:
+            db, db_error = None, str(e)
+            log.error('firebase_init_failed', extra={'error': str(e)})
+    return db
+
+# Endpoints that must answer even without a database
+NO_DB_ENDPOINTS = {'api.home', 'api.health', 'api.ready', 'api.cache_stats', 'api.metrics',
+                   'api.job_status', 'api.job_results', 'api.list_models', 'api.activate_model'}
+
+@api.before_app_request
+def start_timing():
+    """Collect this request's stage spans for the Server-Timing header"""
+    g.request_start = time.perf_counter()
+    start_request_timings()
+    start_request_cache()
+    # One model for the whole request, even if a reload swaps in another meanwhile
+    g.model_pin = analyzer.pin_model()
+
+@api.after_app_request
+def add_server_timing(response):
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or 'unknown', status=response.status_code)
+    # Streamed bodies are produced after this point, so they only report the setup stages
+    timings = request_timings() + [('total', elapsed)]
+    response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+@api.teardown_app_request
+def release_model(exc):
+    if 'model_pin' in g:
+        analyzer.unpin_model(g.pop('model_pin'))
+
+@api.teardown_app_request
+def release_request_cache(exc):
+    end_request_cache()
+
+@api.before_app_request
+def ensure_db():
+    """Connect lazily if this process has no client yet; fail fast if that does not work"""
+    if request.endpoint in NO_DB_ENDPOINTS or db is not None:
+        return None
+    if init_db() is None:
+        return jsonify({'status': 'error', 'error': db_error, 'message': 'Database unavailable'}), 503
+    return None
+
+def create_app(db_client=None, connect_db=True):
+    """WSGI app factory.
+
+    connect_db=False leaves the Firestore client for later (gunicorn's post_fork
+    hook, or the first request), so a preloading master never opens gRPC channels.
+    """
+    configure_logging()
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(api)
+    if db_client is not None or connect_db:
+        init_db(db_client)
+    return app
 
 # ===== ROOT ENDPOINT (REQUIRED FOR RENDER HEALTH CHECK) =====
-@app.route('/', methods=['GET'])
+@api.route('/', methods=['GET'])
 def home():
     """Health check endpoint"""
     return jsonify({
@@ -40,282 +174,821 @@ def home():
         'message': 'Mental Health ML API is running! 🧠',
         'endpoints': {
             '/analyze/<user_id>': 'Analyze user mental health',
+            '/analyze-async/<user_id>': 'Same analysis, parallel fetch and background save',
+            '/score': 'POST {user_id, text, timestamp|date}: score one new message, update crisis flag',
+            '/analysis/<user_id>': 'Latest materialized analysis (?max_age= seconds, recomputed when older)',
             '/debug/users': 'List all users',
-            '/debug/analyze-all': 'Analyze all users',
-            '/health': 'Check API status'
+            '/debug/analyze-all': 'Analyze all users (?persist=1 also stores analysis_results, batched)',
+            '/jobs/analyze-all': 'POST: analyze all users in the background, returns a job id',
+            '/jobs/<job_id>': 'Job progress (done, failed, ETA); /jobs/<job_id>/results for results',
+            '/jobs/refresh-latest': 'POST: refresh stale materialized analyses in the background',
+            '/jobs/<job_id>/resume': 'POST: continue a failed job from its last checkpoint',
+            '/debug/cache': 'Result cache and fetch cache hit/miss counters',
+            '/admin/models': 'Registered model versions and the active one (X-Admin-Token)',
+            '/admin/models/activate': 'POST {version}: load, warm and swap in a model version (X-Admin-Token)',
+            '/metrics': 'Prometheus metrics (stage latencies, reads, errors)',
+            '/health': 'Check API status',
+            '/ready': 'Check model and database are loaded'
         }
     }), 200
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health():
-    """Another health check"""
+    """Liveness check: the process is up (see /ready for dependencies)"""
     return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()}), 200
 
+@api.route('/ready', methods=['GET'])
+def ready():
+    """Readiness check: 503 until the model and the Firestore client are loaded"""
+    checks = {
+        'model': analyzer.active_model() is not None,
+        'database': db is not None,
+    }
+    ok = all(checks.values())
+    return jsonify({
+        'status': 'ready' if ok else 'unavailable',
+        'checks': checks,
+        'model_version': current_model_version(),
+        'database_error': db_error,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if ok else 503
+
+# ===== RESULT CACHE =====
+result_cache = ResultCache(max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+# Fields that differ between runs even when the analysis itself did not change
+VOLATILE_RESULT_FIELDS = ('analyzed_at', 'new_entries_scored')
+
+def result_changed(old, new):
+    if not old:
+        return True
+    strip = lambda r: {k: v for k, v in r.items() if k not in VOLATILE_RESULT_FIELDS}
+    return strip(old) != strip(new)
+
+@api.route('/debug/cache', methods=['GET'])
+def cache_stats():
+    """Analysis result cache and document fetch cache hit/miss counters"""
+    return jsonify({**result_cache.stats(), 'fetch_cache': fetch_cache.stats()}), 200
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage latency histograms and counters in the Prometheus text format"""
+    stats = result_cache.stats()
+    cache_lines = [
+        '# HELP analysis_cache_lookups_total Result cache lookups by outcome',
+        '# TYPE analysis_cache_lookups_total counter',
+        f'analysis_cache_lookups_total{{outcome="hit"}} {stats["hits"]}',
+        f'analysis_cache_lookups_total{{outcome="miss"}} {stats["misses"]}',
+        f'analysis_cache_lookups_total{{outcome="persisted_hit"}} {stats["persisted_hits"]}',
+        '# HELP analysis_cache_size Entries in the result cache',
+        '# TYPE analysis_cache_size gauge',
+        f'analysis_cache_size {stats["size"]}',
+    ]
+    fetched = fetch_cache.stats()
+    cache_lines += [
+        '# HELP fetch_cache_lookups_total Fetched-document cache lookups by outcome',
+        '# TYPE fetch_cache_lookups_total counter',
+        f'fetch_cache_lookups_total{{outcome="hit"}} {fetched["hits"]}',
+        f'fetch_cache_lookups_total{{outcome="request_hit"}} {fetched["request_hits"]}',
+        f'fetch_cache_lookups_total{{outcome="miss"}} {fetched["misses"]}',
+        '# HELP fetch_cache_invalidations_total Cached documents dropped because a change marker moved',
+        '# TYPE fetch_cache_invalidations_total counter',
+        f'fetch_cache_invalidations_total {fetched["invalidations"]}',
+        '# HELP fetch_cache_size Documents in the fetch cache',
+        '# TYPE fetch_cache_size gauge',
+        f'fetch_cache_size {fetched["size"]}',
+    ]
+    return Response(render_metrics(cache_lines), mimetype='text/plain; version=0.0.4')
+
+# ===== CONDITIONAL GET & COMPRESSION =====
+def current_etag(user_id):
+    """The user's analysis ETag, or None if the markers cannot be read (the request is then served normally)"""
+    try:
+        return analysis_etag(db, user_id)
+    except Exception as e:
+        log.warning('etag_failed', extra={'user_id': user_id, 'error': str(e)})
+        return None
+
+# ETag marker reads that overlap the state load (threads start lazily, so this is fork-safe)
+etag_reads = ThreadPoolExecutor(max_workers=MARKER_READ_THREADS, thread_name_prefix='etag')
+
+def etag_and_state(user_id, full):
+    """(ETag, stored state) read concurrently; both still precede every entry fetch"""
+    marker = etag_reads.submit(contextvars.copy_context().run, current_etag, user_id)
+    state = load_state(db, user_id, fresh=full)
+    return marker.result(), state
+
+def result_etag(result):
+    """ETag from the result itself, ignoring fields that change on every run"""
+    stable = {k: v for k, v in result.items() if k not in VOLATILE_RESULT_FIELDS}
+    return entries_fingerprint(json.dumps(stable, sort_keys=True, default=str))
+
+def client_has(etag):
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+def not_modified(etag):
+    return with_etag(Response(status=304), etag)
+
+def with_etag(response, etag):
+    """Tag the response; no-cache makes clients revalidate (cheaply) instead of reusing it blindly.
+
+    Weak, since bodies for the same tag differ in fields like analyzed_at.
+    """
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+    return response
+
+def wants_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+def gzipped(response):
+    """gzip a buffered response body when the client accepts it and it is worth it"""
+    response.vary.add('Accept-Encoding')
+    if not wants_gzip() or response.direct_passthrough or response.content_length < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(response.get_data(), compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def gzip_stream(chunks):
+    """gzip a streamed body, flushing after every chunk so clients still see lines as they are produced"""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
 # ===== MAIN ANALYSIS ENDPOINT =====
-@app.route('/analyze/<user_id>', methods=['GET'])
-def analyze_user(user_id):
-    """Analyze all journals + echo chats for a user"""
+def no_data_result(user_id):
+    return {
+        'status': 'no_data',
+        'message': 'No journal entries or chat messages found',
+        'user_id': user_id
+    }
+
+def error_response(e):
+    if isinstance(e, ModelUnavailable):
+        log.error('analysis_failed', extra={'error': str(e)})
+        return jsonify({'status': 'error', 'error': str(e), 'message': 'Model unavailable'}), 503
+    log.exception('analysis_failed', extra={'error': str(e)})
+    
+    return jsonify({
+        'status': 'error',
+        'error': str(e),
+        'message': 'Analysis failed'
+    }), 500
+
+def finalize_analysis(user_id, results, state, full=False):
+    """Serve a cached result or stamp a fresh one.
+
+    Returns (results, needs_persist). Same windowed entries + same model as last
+    time means the stored result is returned and nothing needs writing.
+    """
+    fingerprint = state['fingerprint']
+    cached = None if full else result_cache.get((user_id, fingerprint))
+    if cached is None and not full and state.get('result_fingerprint') == fingerprint and state.get('latest_result'):
+        cached = dict(state['latest_result'])
+        result_cache.put((user_id, fingerprint), cached)
+        result_cache.record_persisted_hit()
+    if cached is not None:
+        log.info('analysis_cached', extra={'user_id': user_id})
+        cached['new_entries_scored'] = 0
+        return cached, False
+
+    log.info('analysis_scored', extra={'user_id': user_id, 'new_entries_scored': results['new_entries_scored'],
+                                       'total_entries': results['total_entries']})
+
+    results['user_id'] = user_id
+    results['analyzed_at'] = datetime.now().isoformat()
+    results['model_version'] = current_model_version()
+
+    state['result_changed'] = result_changed(state.get('latest_result'), results)
+    state['latest_result'] = results
+    state['result_fingerprint'] = fingerprint
+    result_cache.put((user_id, fingerprint), results)
+    return results, True
+
+def persist_analysis(user_id, results, state):
+    """Save the aggregate state and the latest result, and an analysis_results document if the outcome changed"""
+    changed = state.pop('result_changed', True)
+    classified_live_days = state['live_days']
     try:
-        print(f"🔍 Analyzing user: {user_id}")
-        
-        all_entries = []
+        # Live scores that landed while analyzing are kept; the result must include them
+        if save_state(db, user_id, state) != classified_live_days:
+            results.update(classify_state(state))
+    except Exception as e:
+        log.warning('state_save_failed', extra={'user_id': user_id, 'error': str(e)})
 
-        # Get journals
-        try:
-            logs_ref = db.collection('users').document(user_id).collection('data').document('logs')
-            logs_doc = logs_ref.get()
-            
-            if logs_doc.exists:
-                logs_data = logs_doc.to_dict()
-                print(f"📔 Found journal data for {len(logs_data)} dates")
-                
-                for date_key, day_content in logs_data.items():
-                    if not isinstance(day_content, dict):
-                        continue
-                    
-                    journals = day_content.get('journals', [])
-                    
-                    for journal in journals:
-                        if isinstance(journal, dict):
-                            text = journal.get('text', '')
-                            if text.strip():
-                                all_entries.append({
-                                    'text': text.strip(),
-                                    'date': date_key,
-                                    'source': 'journal'
-                                })
-        except Exception as e:
-            print(f"⚠️ Journal fetch error: {e}")
+    try:
+        save_latest(db, user_id, results)
+    except Exception as e:
+        log.warning('latest_save_failed', extra={'user_id': user_id, 'error': str(e)})
 
-        # Get echo messages
+    # Save results to Firebase (only when the outcome actually changed)
+    if changed:
         try:
-            echo_ref = db.collection('users').document(user_id).collection('echo_history')
-            echo_docs = echo_ref.stream()
-            
-            echo_count = 0
-            for doc in echo_docs:
-                data = doc.to_dict()
-                
-                if data.get('sender') == 'user':
-                    text = data.get('text', '')
-                    if text.strip():
-                        timestamp = data.get('timestamp')
-                        if timestamp:
-                            try:
-                                date_str = timestamp.strftime('%Y-%m-%d')
-                            except:
-                                date_str = 'Chat/Echo'
-                        else:
-                            date_str = 'Chat/Echo'
-                        
-                        all_entries.append({
-                            'text': text.strip(),
-                            'date': date_str,
-                            'source': 'echo'
-                        })
-                        echo_count += 1
-            
-            print(f"💬 Found {echo_count} Echo messages")
+            with span('results_save'):
+                db.collection('users').document(user_id).collection('analysis_results').add({
+                    **results,
+                    'timestamp': firestore.SERVER_TIMESTAMP
+                })
+            log.info('results_saved', extra={'user_id': user_id})
         except Exception as e:
-            print(f"⚠️ Echo fetch error: {e}")
+            log.warning('results_save_failed', extra={'user_id': user_id, 'error': str(e)})
+
+def query_flag(args, name):
+    return args.get(name, '').lower() in ('1', 'true', 'yes')
+
+def int_arg(args, name, default, low=1, high=None):
+    """?name= as an int clamped to [low, high] (default if absent); None if it is not an integer"""
+    try:
+        value = int(args.get(name, default))
+    except ValueError:
+        return None
+    return max(low, value if high is None else min(value, high))
+
+def wants_full(args):
+    """?full=1 ignores the stored aggregates and rebuilds them from scratch"""
+    return query_flag(args, 'full')
+
+@api.route('/analyze/<user_id>', methods=['GET'])
+def analyze_user(user_id):
+    """Analyze all journals + echo chats for a user (304 if If-None-Match still matches)"""
+    try:
+        log.info('analyze_user', extra={'user_id': user_id})
+        full = wants_full(request.args)
+
+        if request.if_none_match:
+            # Nothing changed since the client's copy: no entries read, nothing scored
+            etag, state = current_etag(user_id), None
+            if client_has(etag):
+                return not_modified(etag)
+        else:
+            # No copy to revalidate, so the markers for the ETag cost no extra round trip
+            etag, state = etag_and_state(user_id, full)
+
+        # Only entries added since the last run are scored
+        results, state = run_incremental_analysis(db, user_id, full=full, state=state)
 
         # Check if we have data
-        if not all_entries:
-            return jsonify({
-                'status': 'no_data',
-                'message': 'No journal entries or chat messages found',
-                'user_id': user_id
-            }), 200
+        if results is None:
+            return with_etag(jsonify(no_data_result(user_id)), etag), 200
 
-        print(f"📊 Total entries to analyze: {len(all_entries)}")
+        results, needs_persist = finalize_analysis(user_id, results, state, full)
+        if needs_persist:
+            persist_analysis(user_id, results, state)
 
-        # Run analysis
-        results = analyze_entries(all_entries)
-        
-        results['user_id'] = user_id
-        results['total_entries'] = len(all_entries)
-        results['analyzed_at'] = datetime.now().isoformat()
+        return with_etag(jsonify(results), etag), 200
 
-        # Save results to Firebase
-        try:
-            db.collection('users').document(user_id).collection('analysis_results').add({
-                **results,
-                'timestamp': firestore.SERVER_TIMESTAMP
-            })
-            print("✅ Results saved to Firebase")
-        except Exception as e:
-            print(f"⚠️ Save error: {e}")
+    except Exception as e:
+        return error_response(e)
+
+def refresh_latest(user_id):
+    """Run the incremental analysis and materialize the outcome; returns the result body.
+
+    It is stamped as computed now, so cached documents are revalidated first.
+    """
+    revalidate_user(db, user_id)
+    results, state = run_incremental_analysis(db, user_id)
+    if results is None:
+        results = no_data_result(user_id)
+        save_latest(db, user_id, results)
+        return results
+
+    results, needs_persist = finalize_analysis(user_id, results, state)
+    if needs_persist:
+        persist_analysis(user_id, results, state)
+    else:
+        # Unchanged, but now known to be current
+        save_latest(db, user_id, results)
+    return results
+
+def max_age_arg(args):
+    """?max_age= in seconds (default LATEST_MAX_AGE, negatives count as 0); None if not a finite number"""
+    try:
+        max_age = float(args.get('max_age', LATEST_MAX_AGE))
+    except ValueError:
+        return None
+    return max(0.0, max_age) if math.isfinite(max_age) else None
+
+@api.route('/analysis/<user_id>', methods=['GET'])
+def latest_analysis(user_id):
+    """Dashboard read: one document read while the result is fresh enough.
+
+    The materialized result is served if it is at most ?max_age= seconds old
+    (default LATEST_MAX_AGE); otherwise it is recomputed synchronously.
+    """
+    try:
+        max_age = max_age_arg(request.args)
+        if max_age is None:
+            return jsonify({'status': 'error', 'message': 'max_age must be a number of seconds'}), 400
+        latest = load_latest(db, user_id)
+        age = latest_age(latest)
+        if age is not None and age <= max_age:
+            # Tagged by content, so a recompute with the same outcome still matches
+            etag = result_etag(latest['result'])
+            if client_has(etag):
+                return not_modified(etag)
+            return with_etag(jsonify({**latest['result'], 'served_from': 'materialized',
+                                      'age_seconds': round(age, 1)}), etag), 200
+
+        log.info('latest_stale', extra={'user_id': user_id, 'age_seconds': age})
+        results = refresh_latest(user_id)
+        etag = result_etag(results)
+        if client_has(etag):
+            return not_modified(etag)
+        return with_etag(jsonify({**results, 'served_from': 'computed', 'age_seconds': 0.0}), etag), 200
 
+    except Exception as e:
+        return error_response(e)
+
+@api.route('/score', methods=['POST'])
+def score_message_endpoint():
+    """Score one new message into today's (or its day's) live aggregate.
+
+    Body: {"user_id", "text", optional "timestamp" (ISO 8601) or "date" (YYYY-MM-DD)}.
+    Updates the crisis flag and levels without re-reading the user's history.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        user_id, text = body.get('user_id'), body.get('text')
+        if not user_id or not isinstance(user_id, str) or not isinstance(text, str):
+            return jsonify({'status': 'error', 'message': 'user_id and text are required strings'}), 400
+        try:
+            day = message_date(body.get('timestamp'), body.get('date'))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': f'Invalid timestamp or date: {e}'}), 400
+        results = score_new_message(db, user_id, text, date=day.isoformat())
+        if results is None:
+            return jsonify({'status': 'skipped', 'message': 'Empty message or outside the analysis window',
+                            'user_id': user_id}), 200
         return jsonify(results), 200
 
     except Exception as e:
-        print(f"❌ ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        
-        return jsonify({
-            'status': 'error',
-            'error': str(e),
-            'message': 'Analysis failed'
-        }), 500
+        return error_response(e)
 
-# ===== DEBUG ENDPOINTS =====
-@app.route('/debug/users', methods=['GET'])
-def list_all_users():
-    """Shows ALL user IDs with their data counts"""
+# Fire-and-forget writes for the async endpoint (threads start lazily, so this is fork-safe)
+background_writes = ThreadPoolExecutor(max_workers=BACKGROUND_WRITE_WORKERS, thread_name_prefix='persist')
+
+@api.route('/analyze-async/<user_id>', methods=['GET'])
+async def analyze_user_async(user_id):
+    """Same result as /analyze/<user_id>, with lower latency.
+
+    Journals and echo messages are fetched concurrently, scoring runs in a
+    worker thread off the event loop, and the Firestore writes happen in the
+    background after the response is sent.
+    """
     try:
-        print("🔍 Scanning all users...")
-        
-        users_ref = db.collection('users').list_documents()
-        user_list = []
-        
-        for user_doc_ref in users_ref:
-            user_id = user_doc_ref.id
-            
-            user_info = {
-                'user_id': user_id,
-                'has_journals': False,
-                'has_echo': False,
-                'journal_count': 0,
-                'echo_count': 0,
-                'user_echo_count': 0,
-                'dates_with_data': []
-            }
-            
-            # Check journals
+        log.info('analyze_user', extra={'user_id': user_id, 'mode': 'async'})
+        full = wants_full(request.args)
+
+        async def stored_state():
+            return await asyncio.to_thread(load_state, db, user_id, full)
+
+        if request.if_none_match:
+            etag, state = await asyncio.to_thread(current_etag, user_id), None
+            if client_has(etag):
+                return not_modified(etag)
+        else:
+            # Markers read alongside the state: the ETag adds no round trip, and still precedes the entry fetches
+            etag, state = await asyncio.gather(asyncio.to_thread(current_etag, user_id), stored_state())
+
+        async def state_then_echo(state):
+            # The echo query needs the stored high-water mark
+            if state is None:
+                state = await stored_state()
             try:
-                logs_ref = db.collection('users').document(user_id).collection('data').document('logs')
-                logs_doc = logs_ref.get()
-                
-                if logs_doc.exists:
-                    user_info['has_journals'] = True
-                    logs_data = logs_doc.to_dict()
-                    
-                    journal_count = 0
-                    for date_key, day_content in logs_data.items():
-                        if isinstance(day_content, dict):
-                            journals = day_content.get('journals', [])
-                            if journals:
-                                journal_count += len(journals)
-                                user_info['dates_with_data'].append(date_key)
-                    
-                    user_info['journal_count'] = journal_count
+                return state, *await asyncio.to_thread(fetch_new_echo, db, user_id, state)
             except Exception as e:
-                print(f"Journal error: {e}")
-            
-            # Check echo
+                log.warning('echo_fetch_failed', extra={'user_id': user_id, 'error': str(e)})
+                return state, None, False
+
+        async def journals():
             try:
-                echo_ref = db.collection('users').document(user_id).collection('echo_history')
-                echo_docs = list(echo_ref.stream())
-                
-                total_echo = len(echo_docs)
-                user_echo = sum(1 for doc in echo_docs if doc.to_dict().get('sender') == 'user')
-                
-                user_info['echo_count'] = total_echo
-                user_info['user_echo_count'] = user_echo
-                
-                if total_echo > 0:
-                    user_info['has_echo'] = True
+                return await asyncio.to_thread(fetch_logs, db, user_id)
             except Exception as e:
-                print(f"Echo error: {e}")
+                log.warning('journal_fetch_failed', extra={'user_id': user_id, 'error': str(e)})
+                return None
+
+        (state, echo_messages, echo_rebuild), logs_data = await asyncio.gather(state_then_echo(state), journals())
+
+        results, state = await asyncio.to_thread(apply_updates, state, logs_data, echo_messages, None, echo_rebuild)
+        if results is None:
+            return with_etag(jsonify(no_data_result(user_id)), etag), 200
+
+        results, needs_persist = finalize_analysis(user_id, results, state, full)
+        if needs_persist:
+            background_writes.submit(contextvars.copy_context().run, persist_analysis, user_id, dict(results), state)
+
+        return with_etag(jsonify(results), etag), 200
+
+    except Exception as e:
+        return error_response(e)
+
+# ===== DEBUG ENDPOINTS =====
+def user_stats(user_id):
+    """Journal and echo counts for one user"""
+    user_info = {
+        'user_id': user_id,
+        'has_journals': False,
+        'has_echo': False,
+        'journal_count': 0,
+        'echo_count': 0,
+        'user_echo_count': 0,
+        'dates_with_data': []
+    }
+    
+    # Check journals (inside the analysis window)
+    try:
+        logs_data = fetch_journal_window(db, user_id)
+        
+        if logs_data:
+            user_info['has_journals'] = True
+            
+            journal_count = 0
+            for date_key, day_content in logs_data.items():
+                if isinstance(day_content, dict):
+                    journals = day_content.get('journals', [])
+                    if journals:
+                        journal_count += len(journals)
+                        user_info['dates_with_data'].append(date_key)
             
-            user_list.append(user_info)
+            user_info['journal_count'] = journal_count
+    except Exception as e:
+        log.warning('journal_stats_failed', extra={'user_id': user_id, 'error': str(e)})
+    
+    # Check echo (count() aggregations, no chat documents are downloaded)
+    try:
+        with span('echo_count'):
+            total_echo, user_echo = echo_counts(db, user_id)
         
-        return jsonify({
+        user_info['echo_count'] = total_echo
+        user_info['user_echo_count'] = user_echo
+        
+        if total_echo > 0:
+            user_info['has_echo'] = True
+    except Exception as e:
+        log.warning('echo_stats_failed', extra={'user_id': user_id, 'error': str(e)})
+    
+    return user_info
+
+@api.route('/debug/users', methods=['GET'])
+def list_all_users():
+    """Shows user IDs with their data counts, one page at a time (?limit=&cursor=)"""
+    try:
+        log.info('list_users')
+        
+        limit = int_arg(request.args, 'limit', USERS_PAGE_SIZE, high=MAX_USERS_PAGE_SIZE)
+        if limit is None:
+            return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+        with span('list_users'):
+            user_ids, next_cursor = user_ids_page(db, limit, request.args.get('cursor'))
+        
+        # Stats for every user on the page are fetched in parallel
+        user_list = sorted(bounded_map(user_stats, user_ids, max_workers=ANALYZE_ALL_WORKERS),
+                           key=lambda info: info['user_id'])
+        
+        return gzipped(jsonify({
             'total_users': len(user_list),
             'users': user_list,
+            'next_cursor': next_cursor,
             'timestamp': datetime.now().isoformat()
-        }), 200
+        })), 200
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception('list_users_failed', extra={'error': str(e)})
         return jsonify({'error': str(e)}), 500
 
-@app.route('/debug/analyze-all', methods=['GET'])
+def fetch_user_entries(user_id):
+    """Journal + windowed echo entries for one user: (user_id, entries, error)"""
+    try:
+        return user_id, list(user_entries(db, user_id)), None
+    except Exception as e:
+        log.warning('analyze_user_failed', extra={'user_id': user_id, 'error': str(e)})
+        return user_id, None, e
+
+def analyze_fetched_users(fetched):
+    """Results for a chunk of fetch_user_entries() outputs, scored together.
+
+    Users whose exact entry set was already scored with this model come from
+    the result cache; the rest go through one analyze_entries_batch call.
+    Errors are returned per user, not raised. The whole chunk is scored with
+    one model (ndjson chunks are produced after the request's own pin is gone).
+    """
+    with pinned_model():
+        return _analyze_fetched_users(fetched)
+
+def _analyze_fetched_users(fetched):
+    results, pending, keys = {}, {}, {}
+    for user_id, all_entries, error in fetched:
+        if error is not None:
+            results[user_id] = {'user_id': user_id, 'status': 'error', 'error': str(error)}
+        elif not all_entries:
+            results[user_id] = {'user_id': user_id, 'status': 'no_data', 'message': 'No entries found'}
+        else:
+            keys[user_id] = ('analyze-all', user_id, entries_fingerprint(
+                current_model_version(), str(window_start()), [(e['date'], e['text']) for e in all_entries]))
+            cached = result_cache.get(keys[user_id])
+            if cached is not None:
+                results[user_id] = cached
+            else:
+                pending[user_id] = all_entries
+
+    if pending:
+        try:
+            analyses = analyze_entries_batch(pending)
+        except Exception as e:
+            # Score one by one so a bad user only fails itself
+            log.warning('batch_analysis_failed', extra={'users': len(pending), 'error': str(e)})
+            analyses = {}
+            for user_id, all_entries in pending.items():
+                try:
+                    analyses[user_id] = analyze_entries(all_entries)
+                except Exception as user_error:
+                    results[user_id] = {'user_id': user_id, 'status': 'error', 'error': str(user_error)}
+        for user_id, analysis in analyses.items():
+            analysis['user_id'] = user_id
+            analysis['total_entries'] = len(pending[user_id])
+            analysis['model_version'] = current_model_version()
+            result_cache.put(keys[user_id], analysis)
+            results[user_id] = analysis
+
+    return [results[user_id] for user_id, _, _ in fetched]
+
+def result_writer():
+    """Batched analysis_results writer for the persisted cohort mode"""
+    return ResultWriter(db, RESULTS_BATCH_SIZE, RESULTS_WRITE_RETRIES)
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+@api.route('/debug/analyze-all', methods=['GET'])
 def analyze_all_users():
-    """Analyze ALL users at once"""
+    """Analyze ALL users at once.
+
+    Users are fetched on a bounded thread pool (?workers=, default
+    ANALYZE_ALL_WORKERS) and scored ANALYZE_BATCH_USERS at a time with
+    analyze_entries_batch. With ?format=ndjson each chunk of results is
+    streamed as JSON lines as soon as it is scored, followed by a summary line.
+    With ?persist=1 every analysis is also stored in analysis_results, in
+    WriteBatches of RESULTS_BATCH_SIZE documents.
+    """
     try:
-        users_ref = db.collection('users').list_documents()
-        results = []
-        
-        for user_doc_ref in users_ref:
-            user_id = user_doc_ref.id
-            
-            try:
-                all_entries = []
-                
-                # Get journals
-                logs_ref = db.collection('users').document(user_id).collection('data').document('logs')
-                logs_doc = logs_ref.get()
-                
-                if logs_doc.exists:
-                    logs_data = logs_doc.to_dict()
-                    
-                    for date_key, day_content in logs_data.items():
-                        if isinstance(day_content, dict):
-                            journals = day_content.get('journals', [])
-                            
-                            for journal in journals:
-                                if isinstance(journal, dict):
-                                    text = journal.get('text', '')
-                                    if text.strip():
-                                        all_entries.append({
-                                            'text': text.strip(),
-                                            'date': date_key,
-                                            'source': 'journal'
-                                        })
-                
-                # Get echo
-                echo_ref = db.collection('users').document(user_id).collection('echo_history')
-                echo_docs = echo_ref.stream()
-                
-                for doc in echo_docs:
-                    data = doc.to_dict()
-                    
-                    if data.get('sender') == 'user':
-                        text = data.get('text', '')
-                        if text.strip():
-                            timestamp = data.get('timestamp')
-                            date_str = timestamp.strftime('%Y-%m-%d') if timestamp else 'Chat/Echo'
-                            
-                            all_entries.append({
-                                'text': text.strip(),
-                                'date': date_str,
-                                'source': 'echo'
-                            })
-                
-                # Analyze
-                if all_entries:
-                    analysis = analyze_entries(all_entries)
-                    analysis['user_id'] = user_id
-                    analysis['total_entries'] = len(all_entries)
-                    results.append(analysis)
-                else:
-                    results.append({
-                        'user_id': user_id,
-                        'status': 'no_data',
-                        'message': 'No entries found'
-                    })
-                    
-            except Exception as e:
-                results.append({
-                    'user_id': user_id,
-                    'status': 'error',
-                    'error': str(e)
-                })
-        
-        return jsonify({
+        workers = int_arg(request.args, 'workers', ANALYZE_ALL_WORKERS)
+        if workers is None:
+            return jsonify({'status': 'error', 'message': 'workers must be an integer'}), 400
+        user_ids = (ref.id for ref in db.collection('users').list_documents())
+        fetched = bounded_map(fetch_user_entries, user_ids, max_workers=workers)
+        results = itertools.chain.from_iterable(
+            analyze_fetched_users(chunk) for chunk in chunked(fetched, ANALYZE_BATCH_USERS))
+        writer = result_writer() if query_flag(request.args, 'persist') else None
+        if writer:
+            results = writer.write_through(results)
+        summary = lambda: {'persisted': writer.stats()} if writer else {}
+
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                count = 0
+                try:
+                    for result in results:
+                        count += 1
+                        yield json.dumps(result) + '\n'
+                except Exception as e:
+                    yield json.dumps({'status': 'error', 'error': str(e)}) + '\n'
+                yield json.dumps({'total_users_analyzed': count, **summary(),
+                                  'timestamp': datetime.now().isoformat()}) + '\n'
+            if not wants_gzip():
+                return Response(generate(), mimetype='application/x-ndjson', headers={'Vary': 'Accept-Encoding'})
+            return Response(gzip_stream(generate()), mimetype='application/x-ndjson',
+                            headers={'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'})
+
+        with span('analyze_users'):
+            results = list(results)
+        return gzipped(jsonify({
             'total_users_analyzed': len(results),
             'results': results,
+            **summary(),
             'timestamp': datetime.now().isoformat()
-        }), 200
+        })), 200
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception('analyze_all_failed', extra={'error': str(e)})
+        return jsonify({'error': str(e)}), 500
+
+# ===== BACKGROUND JOBS =====
+job_runner = JobRunner(functools.partial(make_job_store, JOB_STORE, JOB_STORE_PATH), workers=JOB_WORKERS)
+
+@api.before_app_request
+def start_job_workers():
+    """Start this process's job workers on its first request, so interrupted jobs resume"""
+    job_runner.start()
+
+def job_user_ids(job):
+    """Users still to do. The list is fixed when the job first runs, so a resumed
+    job works on the same cohort and skips every user that has a checkpoint."""
+    user_ids = job.params.get('user_ids')
+    if user_ids is None:
+        user_ids = sorted(ref.id for ref in db.collection('users').list_documents())
+        job.params['user_ids'] = user_ids
+        job.save_params()
+    job.set_total(len(user_ids))
+    return (user_id for user_id in user_ids if user_id not in job.completed)
+
+def run_analyze_all_job(job):
+    """Same analysis as /debug/analyze-all, checkpointed per chunk of users.
+
+    With params['persist'] each chunk's analyses are written (batched) before
+    its checkpoint; users whose batch could not be written count as failed
+    and their results carry persisted: false.
+    """
+    todo = job_user_ids(job)
+    fetched = bounded_map(fetch_user_entries, todo, max_workers=job.params.get('workers', ANALYZE_ALL_WORKERS))
+    writer = result_writer() if job.params.get('persist') else None
+    for chunk in chunked(fetched, ANALYZE_BATCH_USERS):
+        scored = analyze_fetched_users(chunk)
+        if writer:
+            writer.add_results(scored)
+            writer.flush()
+        unsaved = set(writer.failed) if writer else set()
+        job.checkpoint([(result['user_id'], False, {**result, 'persisted': False}) if result['user_id'] in unsaved
+                        else (result['user_id'], result.get('status') != 'error', result) for result in scored])
+
+def run_refresh_latest_job(job):
+    """Sweep: re-materialize every user whose latest analysis is older than params['max_age']"""
+    max_age = job.params.get('max_age', LATEST_MAX_AGE // 2)
+
+    def refresh_if_stale(user_id):
+        try:
+            with pinned_model():
+                age = latest_age(load_latest(db, user_id))
+                if age is not None and age <= max_age:
+                    return user_id, True, {'user_id': user_id, 'status': 'fresh'}
+                refresh_latest(user_id)
+            return user_id, True, {'user_id': user_id, 'status': 'refreshed'}
+        except Exception as e:
+            log.warning('latest_refresh_failed', extra={'user_id': user_id, 'error': str(e)})
+            return user_id, False, {'user_id': user_id, 'status': 'error', 'error': str(e)}
+
+    refreshed = bounded_map(refresh_if_stale, job_user_ids(job),
+                            max_workers=job.params.get('workers', ANALYZE_ALL_WORKERS))
+    for chunk in chunked(refreshed, ANALYZE_BATCH_USERS):
+        job.checkpoint(chunk)
+
+job_runner.register('analyze-all', run_analyze_all_job)
+job_runner.register('refresh-latest', run_refresh_latest_job)
+if LATEST_SWEEP_INTERVAL > 0:
+    job_runner.every(LATEST_SWEEP_INTERVAL, 'refresh-latest')
+
+@api.route('/jobs/analyze-all', methods=['POST'])
+def submit_analyze_all():
+    """Queue a background analysis of every user (optional JSON body: {"workers": n, "persist": true})"""
+    try:
+        body = request.get_json(silent=True) or {}
+        params = {'workers': int(body['workers'])} if 'workers' in body else {}
+        if body.get('persist'):
+            params['persist'] = True
+        job_id = job_runner.submit('analyze-all', params)
+        return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}), 202
+    except Exception as e:
+        log.exception('job_submit_failed', extra={'error': str(e)})
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/jobs/refresh-latest', methods=['POST'])
+def submit_refresh_latest():
+    """Queue a sweep refreshing stale materialized analyses (optional JSON body: {"max_age": s, "workers": n})"""
+    try:
+        body = request.get_json(silent=True) or {}
+        params = {k: int(body[k]) for k in ('max_age', 'workers') if k in body}
+        job_id = job_runner.submit('refresh-latest', params, unique=True)
+        if job_id is None:
+            return jsonify({'status': 'already_running', 'message': 'A refresh-latest job is already active'}), 409
+        return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}), 202
+    except Exception as e:
+        log.exception('job_submit_failed', extra={'error': str(e)})
         return jsonify({'error': str(e)}), 500
 
+@api.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Progress of a background job"""
+    job = job_runner.store.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found', 'job_id': job_id}), 404
+    return jsonify(job_progress(job)), 200
+
+@api.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Continue a failed job from its last checkpoint"""
+    if job_runner.store.get_job(job_id) is None:
+        return jsonify({'error': 'Job not found', 'job_id': job_id}), 404
+    if not job_runner.resume(job_id):
+        return jsonify({'error': 'Only failed jobs can be resumed', 'job_id': job_id}), 409
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}), 202
+
+@api.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """Checkpointed per-user results, by user id (?limit=&cursor=)"""
+    job = job_runner.store.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found', 'job_id': job_id}), 404
+    limit = int_arg(request.args, 'limit', USERS_PAGE_SIZE, high=MAX_USERS_PAGE_SIZE)
+    if limit is None:
+        return jsonify({'error': 'limit must be an integer', 'job_id': job_id}), 400
+    results = job_runner.store.results(job_id, limit=limit, after=request.args.get('cursor'))
+    return jsonify({
+        **job_progress(job),
+        'results': results,
+        'next_cursor': results[-1]['user_id'] if len(results) == limit else None,
+    }), 200
+
+# ===== MODEL ADMIN =====
+# A new model is loaded, verified and warmed on this one thread, then swapped in
+# atomically; requests keep scoring with the old model until the swap.
+model_reloads = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-reload')
+reload_status = {'state': 'idle', 'version': None, 'error': None, 'finished_at': None}
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+
+def reload_model(version=None):
+    """Swap in `version` (default: the registry's CURRENT); failures keep the old model"""
+    reload_status.update(state='loading', version=version, error=None)
+    try:
+        model = analyzer.reload_model(version)
+        reload_status.update(state='idle', version=model.version)
+    except Exception as e:
+        reload_status.update(state='failed', error=str(e))
+        log.exception('model_reload_failed', extra={'model_version': version, 'error': str(e)})
+    reload_status['finished_at'] = datetime.now().isoformat()
+
+def watch_model_registry():
+    """Reload whenever CURRENT names another version. Every worker process runs
+    one, so activating a version through any worker reaches all of them."""
+    failed = None
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        try:
+            version = model_registry.current_version()
+        except OSError as e:
+            log.warning('model_watch_failed', extra={'error': str(e)})
+            continue
+        model = analyzer.active_model()
+        if version and version != failed and (model is None or model.version != version):
+            model_reloads.submit(reload_model, version).result()
+            failed = version if reload_status['state'] == 'failed' else None
+
+@api.before_app_request
+def start_model_watcher():
+    """Start this process's registry watcher on its first request"""
+    global _watcher_pid
+    if MODEL_WATCH_INTERVAL <= 0 or _watcher_pid == os.getpid():
+        return
+    with _watcher_lock:
+        if _watcher_pid != os.getpid():
+            threading.Thread(target=watch_model_registry, name='model-watcher', daemon=True).start()
+            _watcher_pid = os.getpid()
+
+def admin_denied():
+    """403 body unless the request carries ADMIN_TOKEN (always 403 when it is unset)"""
+    token = request.headers.get('X-Admin-Token', '')
+    if ADMIN_TOKEN and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return None
+    return jsonify({'error': 'Forbidden'}), 403
+
+@api.route('/admin/models', methods=['GET'])
+def list_models():
+    """Registered versions with their manifests, the active model and the last reload"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    model = analyzer.active_model()
+    return jsonify({
+        'active_version': model.version if model else None,
+        'active_manifest': model.manifest if model else None,
+        'current_version': model_registry.current_version(),
+        'versions': model_registry.list_versions(),
+        'reload': reload_status,
+    }), 200
+
+@api.route('/admin/models/activate', methods=['POST'])
+def activate_model():
+    """Point CURRENT at {"version": ...} and load it in the background (other workers follow via their watcher)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    version = (request.get_json(silent=True) or {}).get('version')
+    if not version:
+        return jsonify({'error': 'version is required'}), 400
+    try:
+        model_registry.set_current(version)
+    except FileNotFoundError:
+        return jsonify({'error': 'Model version not found', 'version': version}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e), 'version': version}), 400
+    model_reloads.submit(reload_model, version)
+    return jsonify({'status': 'loading', 'version': version, 'status_url': '/admin/models'}), 202
+
 # ===== RUN APP =====
+# Development server only; production runs gunicorn with gunicorn.conf.py (see wsgi.py)
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=7860)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=port)
\ No newline at end of file
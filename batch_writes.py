@@ -0,0 +1,97 @@
+"""Batched writes of analysis results.
+
+One WriteBatch commit stores up to 500 documents in a single round trip,
+instead of one add() per user. Document ids are chosen client-side before
+the first attempt, so retrying a commit whose response was lost rewrites
+the same documents rather than adding duplicates.
+"""
+import time
+from firebase_admin import firestore
+from google.api_core import exceptions
+from observability import get_logger, span
+
+log = get_logger('batch_writes')
+
+# Firestore's limit on writes per batch
+MAX_BATCH_SIZE = 500
+RETRYABLE_ERRORS = (exceptions.Aborted, exceptions.DeadlineExceeded, exceptions.InternalServerError,
+                    exceptions.ResourceExhausted, exceptions.ServiceUnavailable)
+
+
+def persistable(result):
+    """Only real analyses are stored (not errors or no_data placeholders)"""
+    return result.get('status') == 'success'
+
+
+class ResultWriter:
+    """Buffers analysis_results documents and commits them `batch_size` at a time.
+
+    A batch that still fails after `retries` attempts (exponential backoff
+    from `backoff` seconds) is logged and its user ids land in `failed`;
+    nothing is raised, so one bad batch does not abort a cohort run.
+    """
+
+    def __init__(self, db, batch_size=MAX_BATCH_SIZE, retries=3, backoff=0.5):
+        self.db = db
+        self.batch_size = max(1, min(int(batch_size), MAX_BATCH_SIZE))
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.written = 0
+        self.batches = 0
+        self.retried = 0
+        self.failed = []
+        self._pending = []
+
+    def add(self, user_id, result):
+        ref = self.db.collection('users').document(user_id).collection('analysis_results').document()
+        self._pending.append((user_id, ref, {**result, 'timestamp': firestore.SERVER_TIMESTAMP}))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def add_results(self, results):
+        for result in results:
+            if persistable(result):
+                self.add(result['user_id'], result)
+
+    def write_through(self, results):
+        """Yield `results` unchanged while queueing the persistable ones; flushes when exhausted"""
+        try:
+            for result in results:
+                if persistable(result):
+                    self.add(result['user_id'], result)
+                yield result
+        finally:
+            self.flush()
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        for attempt in range(self.retries + 1):
+            batch = self.db.batch()
+            for _, ref, data in pending:
+                batch.set(ref, data)
+            try:
+                with span('results_batch_commit'):
+                    batch.commit()
+                self.written += len(pending)
+                self.batches += 1
+                return
+            except Exception as e:
+                if not isinstance(e, RETRYABLE_ERRORS) or attempt == self.retries:
+                    log.error('results_batch_failed', extra={'documents': len(pending), 'attempts': attempt + 1,
+                                                             'error': str(e)})
+                    self.failed.extend(user_id for user_id, _, _ in pending)
+                    return
+                self.retried += 1
+                log.warning('results_batch_retry', extra={'documents': len(pending), 'attempt': attempt + 1,
+                                                          'error': str(e)})
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def stats(self):
+        return {
+            'written': self.written,
+            'batches': self.batches,
+            'retried_batches': self.retried,
+            'failed': len(self.failed),
+        }
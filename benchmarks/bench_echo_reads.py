@@ -0,0 +1,51 @@
+"""Documents read per echo_history fetch: full stream vs windowed query.
+
+Seeds one user with a long chat history (half bot, half user messages, spread
+over many months) in the in-memory Firestore stand-in and counts reads.
+
+Run from the repo root:  python -m benchmarks.bench_echo_reads
+"""
+from datetime import datetime, timedelta, timezone
+
+from analyzer import WINDOW_DAYS
+from benchmarks.fake_firestore import FakeFirestore
+from queries import echo_ref, user_echo_query
+
+
+def seed(db, user_id, days, messages_per_day):
+    now = datetime.now(timezone.utc)
+    n = 0
+    for day in range(days):
+        for i in range(messages_per_day):
+            n += 1
+            echo_ref(db, user_id).document(f"m{n:07d}").set({
+                'sender': 'user' if i % 2 == 0 else 'bot',
+                'text': f"message {n} about my day",
+                'timestamp': now - timedelta(days=day, minutes=i),
+                'metadata': {'model': 'echo', 'tokens': 42},
+            })
+
+
+def count_reads(db, stream):
+    db.reset_counters()
+    docs = list(stream)
+    return db.reads, docs
+
+
+def run():
+    print(f"{'history days':>12} {'full reads':>10} {'window reads':>12} {'fields/doc':>10}")
+    for days in (14, 90, 365, 730):
+        db = FakeFirestore()
+        seed(db, 'u1', days, messages_per_day=10)
+
+        full_reads, _ = count_reads(db, echo_ref(db, 'u1').stream())
+        window_reads, docs = count_reads(db, user_echo_query(db, 'u1').stream())
+
+        expected = min(days, WINDOW_DAYS + 1) * 5  # user messages inside the window
+        assert window_reads == expected, (window_reads, expected)
+        assert all(set(d.to_dict()) <= {'text', 'timestamp'} for d in docs)
+        print(f"{days:>12} {full_reads:>10} {window_reads:>12} {len(docs[0].to_dict()):>10}")
+
+
+if __name__ == '__main__':
+    run()
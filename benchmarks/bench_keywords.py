@@ -0,0 +1,55 @@
+"""Keyword counting cost as the keyword lists grow.
+
+Compares three count_keywords calls per entry against one KeywordMatcher scan,
+with the clinical lists padded by N synthetic terms.
+
+Run from the repo root:  python -m benchmarks.bench_keywords
+"""
+import random
+import string
+import time
+
+from analyzer import (ANXIETY_KEYWORDS, DEPRESSION_KEYWORDS, SUICIDAL_KEYWORDS,
+                      KeywordMatcher, count_keywords)
+from benchmarks.bench_sentiment import make_texts
+
+
+def synthetic_terms(n, seed=7):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))) for _ in range(n)]
+
+
+def time_per_entry(fn, texts, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def run(extra_sizes=(0, 100, 500, 2000), n_texts=2000):
+    texts = make_texts(n_texts)
+    print(f"{'terms':>6} {'count_keywords us':>18} {'matcher us':>11} {'speedup':>8}")
+    for extra in extra_sizes:
+        padding = synthetic_terms(extra)
+        dep = DEPRESSION_KEYWORDS + padding[0::3]
+        anx = ANXIETY_KEYWORDS + padding[1::3]
+        sui = SUICIDAL_KEYWORDS + padding[2::3]
+        matcher = KeywordMatcher({'dep': dep, 'anx': anx, 'sui': sui})
+
+        def per_list(t):
+            return count_keywords(t, dep), count_keywords(t, anx), count_keywords(t, sui)
+
+        for t in texts[:200]:
+            assert matcher.count(t) == per_list(t)
+
+        old_us = time_per_entry(per_list, texts)
+        new_us = time_per_entry(matcher.count, texts)
+        total = len(dep) + len(anx) + len(sui)
+        print(f"{total:>6} {old_us:>18.1f} {new_us:>11.1f} {old_us / new_us:>7.1f}x")
+
+
+if __name__ == '__main__':
+    run()
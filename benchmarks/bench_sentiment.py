@@ -0,0 +1,48 @@
+"""Per-row vs batched sentiment scoring throughput.
+
+Run from the repo root:  python -m benchmarks.bench_sentiment [n_entries]
+"""
+import random
+import sys
+import time
+
+from analyzer import get_sentiment, get_sentiments
+
+SAMPLE_TEXTS = [
+    "I'm feeling really happy today!",
+    "I hate everything, life is terrible",
+    "Just another normal day at work, nothing special",
+    "I feel so worthless and alone, can't sleep again",
+    "Everything is amazing, best day ever!",
+    "My heart racing all night, so anxious about tomorrow",
+    "Had lunch with friends, it was nice https://example.com",
+    "tired and exhausted, no point in trying anymore",
+]
+
+
+def make_texts(n, seed=42):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(SAMPLE_TEXTS) for _ in range(rng.randint(1, 4))) for _ in range(n)]
+
+
+def run(n):
+    texts = make_texts(n)
+
+    start = time.perf_counter()
+    per_row = [get_sentiment(t) for t in texts]
+    per_row_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = get_sentiments(texts)
+    batched_s = time.perf_counter() - start
+
+    assert list(batched) == [int(s) for s in per_row], "batched scores differ from per-row scores"
+
+    print(f"entries:  {n}")
+    print(f"per-row:  {n / per_row_s:10.0f} entries/sec ({per_row_s * 1000:.1f} ms)")
+    print(f"batched:  {n / batched_s:10.0f} entries/sec ({batched_s * 1000:.1f} ms)")
+    print(f"speedup:  {per_row_s / batched_s:.1f}x")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
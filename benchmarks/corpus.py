@@ -0,0 +1,60 @@
+"""Synthetic users in the shapes the app reads from Firestore.
+
+users/{id}/data/logs      {'YYYY-MM-DD': {'journals': [{'text': ...}, ...]}, ...}
+users/{id}/echo_history   {'sender': 'user'|'bot', 'text': ..., 'timestamp': datetime}
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+from analyzer import ANXIETY_KEYWORDS, DEPRESSION_KEYWORDS, SUICIDAL_KEYWORDS
+from queries import echo_ref, logs_ref
+
+FILLER_WORDS = (
+    "today i went to work and talked with my friend about the weekend it was "
+    "really nice to see everyone again but the traffic was terrible and i feel "
+    "happy grateful calm busy lunch dinner movie music walk park coffee family"
+).split()
+KEYWORD_WORDS = DEPRESSION_KEYWORDS + ANXIETY_KEYWORDS + SUICIDAL_KEYWORDS[:2]
+
+
+def make_text(rng, words, keyword_rate=0.08):
+    return ' '.join(rng.choice(KEYWORD_WORDS) if rng.random() < keyword_rate else rng.choice(FILLER_WORDS)
+                    for _ in range(max(1, words)))
+
+
+def generate_user(db, user_id, rng, journal_days=30, journals_per_day=1, echo_messages=200,
+                  message_words=20, history_days=60, now=None):
+    """Write one user's journals and echo history; returns the number of user-sent texts"""
+    now = now or datetime.now(timezone.utc)
+    logs = {}
+    for day in range(journal_days):
+        date_key = str((now - timedelta(days=day)).date())
+        logs[date_key] = {'journals': [{'text': make_text(rng, message_words * 3)} for _ in range(journals_per_day)]}
+    if logs:
+        logs_ref(db, user_id).set(logs)
+
+    user_texts = journal_days * journals_per_day
+    for i in range(echo_messages):
+        sender = 'user' if i % 2 == 0 else 'bot'
+        user_texts += sender == 'user'
+        echo_ref(db, user_id).document(f"msg{i:06d}").set({
+            'sender': sender,
+            'text': make_text(rng, rng.randint(message_words // 2, message_words * 3 // 2)),
+            'timestamp': now - timedelta(minutes=rng.randint(0, history_days * 24 * 60)),
+        })
+    return user_texts
+
+
+def generate_corpus(db, users=50, seed=42, **user_kwargs):
+    """Populate `db` with `users` synthetic users (ids user00000, user00001, ...)"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    return {f"user{i:05d}": generate_user(db, f"user{i:05d}", rng, now=now, **user_kwargs) for i in range(users)}
+
+
+def generate_entries(n, seed=42, message_words=20, days=20):
+    """analyze_entries() input without going through Firestore"""
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    return [{'text': make_text(rng, message_words), 'date': str(today - timedelta(days=rng.randint(0, days))),
+             'source': 'echo'} for _ in range(n)]
@@ -0,0 +1,367 @@
+"""In-memory stand-in for the slice of the Firestore client the app uses.
+
+Counts document reads and writes so query pushdown can be checked without a
+real project or emulator. `latency` (seconds) is slept once per simulated RPC
+to approximate network round trips.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound, ServiceUnavailable
+
+_OPS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def _resolve(data, old=None):
+    """Apply SERVER_TIMESTAMP, Increment and ArrayUnion sentinels (at any depth) the way the server would"""
+    now = datetime.now(timezone.utc)
+    old = old or {}
+    resolved = {}
+    for k, v in data.items():
+        if v is firestore.SERVER_TIMESTAMP:
+            v = now
+        elif isinstance(v, firestore.Increment):
+            v = (old.get(k) if isinstance(old.get(k), (int, float)) else 0) + v.value
+        elif isinstance(v, firestore.ArrayUnion):
+            current = list(old.get(k)) if isinstance(old.get(k), list) else []
+            v = current + [x for i, x in enumerate(v.values) if x not in current and x not in v.values[:i]]
+        elif isinstance(v, dict):
+            v = _resolve(v, old.get(k) if isinstance(old.get(k), dict) else None)
+        resolved[k] = v
+    return resolved
+
+
+def _unquote(field_path):
+    """Top-level field name from a field path ('`2026-01-31`' -> '2026-01-31')"""
+    if len(field_path) > 1 and field_path[0] == field_path[-1] == '`':
+        return field_path[1:-1].replace('\\`', '`').replace('\\\\', '\\')
+    return field_path
+
+
+def _deep_merge(old, new):
+    """set(merge=True): maps are merged key by key, everything else is replaced"""
+    merged = dict(old)
+    for k, v in new.items():
+        merged[k] = _deep_merge(old[k], v) if isinstance(v, dict) and isinstance(old.get(k), dict) else v
+    return merged
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.update_time = update_time
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeFirestore:
+    def __init__(self, latency=0.0):
+        self.docs = {}          # path tuple -> dict
+        self.update_times = {}  # path tuple -> datetime
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+        self.fail_commits = 0  # the next N batch commits raise ServiceUnavailable (retry testing)
+        self._auto_id = 0
+        self._last_write = datetime.min.replace(tzinfo=timezone.utc)
+        self._lock = threading.RLock()
+        self._firestore_api = FakeFirestoreApi(self)
+        self._rpc_metadata = ()
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        """Batched get: one RPC for all `references`, a snapshot each (missing ones too)"""
+        self._rpc()
+        for ref in references:
+            yield ref._snapshot(field_paths)
+
+    def write_option(self, last_update_time=None):
+        return {'last_update_time': last_update_time}
+
+    def reset_counters(self):
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+
+    def _rpc(self):
+        with self._lock:
+            self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _count_read(self, n=1):
+        with self._lock:
+            self.reads += n
+
+    def _write(self, path, data, merge=False):
+        """merge=False replaces the document, True merges maps (set), 'fields' replaces top-level fields (update)"""
+        with self._lock:
+            old = self.docs.get(path) or {}
+            data = _resolve(data, old)
+            if merge == 'fields':
+                data = {k: v for k, v in {**old, **data}.items() if v is not firestore.DELETE_FIELD}
+            elif merge:
+                data = _deep_merge(old, data)
+            self.docs[path] = data
+            # Strictly increasing, so a precondition on an earlier update_time always fails
+            self._last_write = max(datetime.now(timezone.utc), self._last_write + timedelta(microseconds=1))
+            self.update_times[path] = self._last_write
+            self.writes += 1
+
+
+class FakeDocumentName:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeListDocumentsResponse:
+    def __init__(self, documents, next_page_token):
+        self.documents = documents
+        self.next_page_token = next_page_token
+
+
+class FakeListDocumentsPager:
+    """Pages of a ListDocuments call; the page token is the last id of the previous page"""
+
+    def __init__(self, db, path, page_size, page_token):
+        self._db = db
+        self._path = path
+        self._page_size = page_size or 300
+        self._page_token = page_token
+
+    @property
+    def pages(self):
+        token = self._page_token
+        while True:
+            self._db._rpc()
+            depth = len(self._path) + 1
+            ids = sorted({p[depth - 1] for p in self._db.docs
+                          if len(p) > depth - 1 and p[:depth - 1] == self._path and p[depth - 1] > token})
+            page = ids[:self._page_size]
+            token = page[-1] if len(ids) > self._page_size else ''
+            yield FakeListDocumentsResponse([FakeDocumentName('/'.join(self._path + (i,))) for i in page], token)
+            if not token:
+                return
+
+
+class FakeFirestoreApi:
+    """The GAPIC client behind CollectionReference.list_documents"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def list_documents(self, request, metadata=()):
+        parent = tuple(request['parent'].split('/')) if request['parent'] else ()
+        return FakeListDocumentsPager(self._db, parent + (request['collection_id'],), request.get('page_size'),
+                                      request.get('page_token') or '')
+
+
+class FakeDocumentRef:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollection(self._db, self.path + (name,))
+
+    def get(self, field_paths=None, **kwargs):
+        self._db._rpc()
+        return self._snapshot(field_paths)
+
+    def _snapshot(self, field_paths=None):
+        self._db._count_read()
+        data = self._db.docs.get(self.path)
+        if data is not None and field_paths is not None:
+            fields = {_unquote(path) for path in field_paths}
+            data = {k: v for k, v in data.items() if k in fields}
+        return FakeSnapshot(self, data, self._db.update_times.get(self.path))
+
+    def create(self, data):
+        self._db._rpc()
+        with self._db._lock:
+            if self.path in self._db.docs:
+                raise AlreadyExists(f"Document already exists: {'/'.join(self.path)}")
+            self._db._write(self.path, data)
+
+    def set(self, data, merge=False):
+        self._db._rpc()
+        self._db._write(self.path, data, merge=merge)
+
+    def update(self, data, option=None):
+        self._db._rpc()
+        with self._db._lock:
+            if self.path not in self._db.docs:
+                raise NotFound(f"No document to update: {'/'.join(self.path)}")
+            if option and option['last_update_time'] != self._db.update_times.get(self.path):
+                raise FailedPrecondition(f"Document changed since {option['last_update_time']}")
+            self._db._write(self.path, {_unquote(k): v for k, v in data.items()}, merge='fields')
+
+    def delete(self):
+        self._db.docs.pop(self.path, None)
+        self._db.update_times.pop(self.path, None)
+
+
+class FakeWriteBatch:
+    """WriteBatch: buffered writes applied together by one commit RPC"""
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append((reference.path, document_data, merge))
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append((reference.path, {_unquote(k): v for k, v in field_updates.items()}, 'fields'))
+
+    def commit(self, retry=None, timeout=None):
+        self._db._rpc()
+        with self._db._lock:
+            if self._db.fail_commits:
+                self._db.fail_commits -= 1
+                raise ServiceUnavailable("Injected commit failure")
+        for path, data, merge in self._writes:
+            self._db._write(path, data, merge=merge)
+        results, self._writes = [datetime.now(timezone.utc)] * len(self._writes), []
+        return results
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), order=None, fields=None, limit=None):
+        self._collection = collection
+        self._filters = list(filters)
+        self._order = order
+        self._fields = fields
+        self._limit = limit
+
+    def _clone(self, **changes):
+        params = dict(filters=self._filters, order=self._order, fields=self._fields, limit=self._limit)
+        params.update(changes)
+        return FakeQuery(self._collection, **params)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._clone(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._clone(order=(field_path, direction))
+
+    def select(self, field_paths):
+        return self._clone(fields=list(field_paths))
+
+    def limit(self, count):
+        return self._clone(limit=count)
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            # Like Firestore, documents missing the field never match a filter on it
+            if field not in data or not _OPS[op](data[field], value):
+                return False
+        return True
+
+    def stream(self):
+        db = self._collection._db
+        db._rpc()
+        rows = [(path, data) for path, data in self._collection._children() if self._matches(data)]
+        if self._order:
+            field, direction = self._order
+            rows = [r for r in rows if field in r[1]]
+            rows.sort(key=lambda r: r[1][field], reverse=direction == 'DESCENDING')
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        for path, data in rows:
+            db._count_read()
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            yield FakeSnapshot(FakeDocumentRef(db, path), dict(data), db.update_times.get(path))
+
+    def get(self):
+        return list(self.stream())
+
+    def count(self, alias=None):
+        return FakeCountQuery(self, alias or 'count')
+
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeCountQuery:
+    """count() aggregation: billed as one read per 1000 index entries, no documents returned"""
+
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias
+
+    def get(self):
+        query = self._query
+        query._collection._db._rpc()
+        n = sum(1 for _, data in query._collection._children() if query._matches(data))
+        query._collection._db._count_read(max(1, -(-n // 1000)))
+        return [[FakeAggregationResult(self._alias, n)]]
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path[-1]
+        super().__init__(self)
+
+    def _children(self):
+        depth = len(self.path) + 1
+        return [(p, d) for p, d in sorted(self._db.docs.items()) if len(p) == depth and p[:-1] == self.path]
+
+    def document(self, document_id=None):
+        if document_id is None:
+            self._db._auto_id += 1
+            document_id = f"auto{self._db._auto_id:08d}"
+        return FakeDocumentRef(self._db, self.path + (document_id,))
+
+    def add(self, data):
+        with self._db._lock:
+            ref = self.document()
+        ref.set(data)
+        return datetime.now(timezone.utc), ref
+
+    def _parent_info(self):
+        return '/'.join(self.path[:-1]), None
+
+    def list_documents(self, page_size=None):
+        self._db._rpc()
+        # Like Firestore, parents that only hold subcollections are listed too
+        depth = len(self.path) + 1
+        ids = sorted({p[depth - 1] for p in self._db.docs if len(p) > depth - 1 and p[:depth - 1] == self.path})
+        return [FakeDocumentRef(self._db, self.path + (i,)) for i in ids]
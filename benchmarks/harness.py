@@ -0,0 +1,49 @@
+"""Timing and memory measurement shared by the benchmark suite."""
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def measure(name, fn, iterations=20, items_per_call=1, warmup=1):
+    """Call fn repeatedly and summarize latency, throughput and memory.
+
+    Latencies come from an untraced pass; peak allocation comes from one extra
+    call under tracemalloc, since tracing distorts timings.
+    """
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = latencies.sum()
+    return {
+        'name': name,
+        'iterations': iterations,
+        'items_per_call': items_per_call,
+        'throughput_per_sec': iterations * items_per_call / total if total else float('inf'),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'mean_ms': float(latencies.mean() * 1000),
+        'peak_alloc_mb': peak / 2 ** 20,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def print_table(results):
+    print(f"{'benchmark':<34} {'items/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'alloc MB':>9}")
+    for r in results:
+        print(f"{r['name']:<34} {r['throughput_per_sec']:>10.0f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['peak_alloc_mb']:>9.2f}")
@@ -0,0 +1,225 @@
+"""Benchmark suite over a synthetic cohort in the in-memory Firestore stand-in.
+
+Run from the repo root:
+    python -m benchmarks.run --users 50 --latency 0.005 --output bench.json
+
+Every benchmark reports throughput, p50/p95/p99 latency and peak allocation.
+Results are written as JSON (with the git commit) so runs can be compared
+between commits.
+"""
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+from analyzer import (ANXIETY_KEYWORDS, DEPRESSION_KEYWORDS, SUICIDAL_KEYWORDS, analyze_entries,
+                      analyze_entries_batch, count_keyword_categories, count_keywords, current_model_version,
+                      get_sentiment)
+from benchmarks.corpus import generate_corpus, generate_entries, make_text
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.harness import measure, print_table
+
+
+def bench_get_sentiment(args):
+    import random
+    rng = random.Random(1)
+    texts = itertools.cycle([make_text(rng, args.message_words) for _ in range(500)])
+    return [measure('get_sentiment', lambda: get_sentiment(next(texts)), iterations=args.iterations * 50)]
+
+
+def bench_count_keywords(args):
+    import random
+    rng = random.Random(2)
+    texts = itertools.cycle([make_text(rng, args.message_words) for _ in range(500)])
+
+    def per_list():
+        text = next(texts)
+        for keywords in (DEPRESSION_KEYWORDS, ANXIETY_KEYWORDS, SUICIDAL_KEYWORDS):
+            count_keywords(text, keywords)
+
+    return [
+        measure('count_keywords x3', per_list, iterations=args.iterations * 50),
+        measure('count_keyword_categories', lambda: count_keyword_categories(next(texts)),
+                iterations=args.iterations * 50),
+    ]
+
+
+def bench_analyze_entries(args):
+    entries = generate_entries(args.entries, message_words=args.message_words)
+    return [measure(f'analyze_entries ({args.entries} entries)', lambda: analyze_entries(entries),
+                    iterations=args.iterations, items_per_call=len(entries))]
+
+
+def bench_analyze_entries_batch(args):
+    cohort = {f"user{i:05d}": generate_entries(args.entries_per_user, seed=i, message_words=args.message_words)
+              for i in range(args.users)}
+    total = sum(len(entries) for entries in cohort.values())
+    return [
+        measure(f'analyze_entries per user ({args.users} users)',
+                lambda: {user_id: analyze_entries(entries) for user_id, entries in cohort.items()},
+                iterations=max(3, args.iterations // 5), items_per_call=total),
+        measure(f'analyze_entries_batch ({args.users} users)', lambda: analyze_entries_batch(cohort),
+                iterations=max(3, args.iterations // 5), items_per_call=total),
+    ]
+
+
+def bench_scoring_executor(args):
+    """analyze_entries_batch over a large cohort: in-thread vs process pools of growing size"""
+    import os
+    from scoring import ProcessScoringExecutor, ThreadScoringExecutor
+    cohort = {f"user{i:05d}": generate_entries(args.entries_per_user, seed=i, message_words=args.message_words)
+              for i in range(args.cohort_users)}
+    total = sum(len(entries) for entries in cohort.values())
+    iterations = max(3, args.iterations // 5)
+    expected = analyze_entries_batch(cohort, executor=ThreadScoringExecutor())
+    results = [measure(f'scoring thread ({total} entries)',
+                       lambda: analyze_entries_batch(cohort, executor=ThreadScoringExecutor()),
+                       iterations=iterations, items_per_call=total)]
+    baseline = results[0]['throughput_per_sec']
+    cores = os.cpu_count() or 1
+    processes = args.processes or [p for p in (2, 4, 8, 16) if p <= max(2, cores)]
+    for n in processes:
+        executor = ProcessScoringExecutor(processes=n, min_batch=0)
+        try:
+            # The warmup call also spawns the workers and loads the model in them
+            assert analyze_entries_batch(cohort, executor=executor) == expected, "process pool results differ"
+            result = measure(f'scoring process x{n} ({total} entries)',
+                             lambda: analyze_entries_batch(cohort, executor=executor),
+                             iterations=iterations, items_per_call=total)
+        finally:
+            executor.shutdown()
+        result['speedup'] = round(result['throughput_per_sec'] / baseline, 2)
+        print(f"⚡ {n} processes: {result['speedup']}x in-thread throughput ({cores} cores)")
+        results.append(result)
+    return results
+
+
+def bench_result_writes(args):
+    """Storing N analysis results: one add() per document vs ResultWriter batches"""
+    from batch_writes import ResultWriter
+    results = [{'user_id': f"user{i:05d}", 'status': 'success', 'depression_level': 'none', 'anxiety_level': 'mild',
+                'risk_level': 'low', 'negative_days': i % 7, 'total_days_analyzed': 14, 'crisis_detected': False}
+               for i in range(args.write_docs)]
+    iterations = max(3, args.iterations // 5)
+
+    def per_document():
+        db = FakeFirestore(latency=args.latency)
+        for result in results:
+            db.collection('users').document(result['user_id']).collection('analysis_results').add(result)
+
+    def batched(batch_size):
+        db = FakeFirestore(latency=args.latency)
+        writer = ResultWriter(db, batch_size=batch_size)
+        writer.add_results(results)
+        writer.flush()
+        assert writer.written == len(results)
+
+    out = [measure(f'add() per document ({args.write_docs} docs)', per_document, iterations=iterations,
+                   items_per_call=len(results))]
+    for batch_size in args.write_batch_sizes:
+        result = measure(f'ResultWriter batch={batch_size}', lambda: batched(batch_size), iterations=iterations,
+                         items_per_call=len(results))
+        result['speedup'] = round(result['throughput_per_sec'] / out[0]['throughput_per_sec'], 1)
+        print(f"⚡ batch={batch_size}: {result['speedup']}x per-document add() ({args.latency * 1000:g} ms per RPC)")
+        out.append(result)
+    return out
+
+
+def make_client(args):
+    import app as app_module
+    db = FakeFirestore()
+    generate_corpus(db, users=args.users, journal_days=args.journal_days, echo_messages=args.echo_messages,
+                    message_words=args.message_words)
+    db.latency = args.latency
+    return app_module, app_module.create_app(db_client=db).test_client(), db
+
+
+def bench_analyze_endpoint(args):
+    app_module, client, db = make_client(args)
+    user_ids = itertools.cycle(sorted({path[1] for path in db.docs}))
+    results = []
+    for path, label in (('/analyze/{}?full=1', 'rebuild'), ('/analyze/{}', 'incremental'),
+                        ('/analyze-async/{}?full=1', 'async rebuild')):
+        results.append(measure(f'/analyze ({label})', lambda: client.get(path.format(next(user_ids))),
+                               iterations=args.iterations))
+    return results
+
+
+def bench_analyze_all(args):
+    app_module, client, db = make_client(args)
+
+    def cold():
+        app_module.result_cache.clear()
+        client.get('/debug/analyze-all')
+
+    return [
+        measure('/debug/analyze-all (cold cache)', cold, iterations=max(3, args.iterations // 5),
+                items_per_call=args.users),
+        measure('/debug/analyze-all (ndjson)', lambda: (app_module.result_cache.clear(),
+                                                        client.get('/debug/analyze-all?format=ndjson').data),
+                iterations=max(3, args.iterations // 5), items_per_call=args.users),
+    ]
+
+
+BENCHMARKS = {
+    'get_sentiment': bench_get_sentiment,
+    'count_keywords': bench_count_keywords,
+    'analyze_entries': bench_analyze_entries,
+    'analyze_entries_batch': bench_analyze_entries_batch,
+    'scoring_executor': bench_scoring_executor,
+    'result_writes': bench_result_writes,
+    'analyze': bench_analyze_endpoint,
+    'analyze_all': bench_analyze_all,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='*', choices=sorted(BENCHMARKS), help="run a subset")
+    parser.add_argument('--users', type=int, default=30)
+    parser.add_argument('--journal-days', type=int, default=30)
+    parser.add_argument('--echo-messages', type=int, default=200)
+    parser.add_argument('--message-words', type=int, default=20)
+    parser.add_argument('--entries', type=int, default=500, help="entries per analyze_entries call")
+    parser.add_argument('--entries-per-user', type=int, default=40, help="entries per user for analyze_entries_batch")
+    parser.add_argument('--cohort-users', type=int, default=500, help="users in the scoring_executor cohort")
+    parser.add_argument('--processes', type=int, nargs='*', help="pool sizes for scoring_executor (default 2, 4, 8, 16 up to the core count)")
+    parser.add_argument('--write-docs', type=int, default=2000, help="documents written by result_writes")
+    parser.add_argument('--write-batch-sizes', type=int, nargs='*', default=[50, 500])
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds injected per Firestore RPC")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.only or BENCHMARKS:
+        results.extend(BENCHMARKS[name](args))
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'model_version': current_model_version(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'timestamp': datetime.now().isoformat(),
+                'config': vars(args),
+                'results': results,
+            }, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
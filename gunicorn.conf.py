@@ -0,0 +1,30 @@
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', 7860)}"
+
+# Load models once in the master; forked workers share them copy-on-write
+preload_app = True
+
+# Threaded workers: requests mostly wait on Firestore, so threads keep a core busy
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers don't touch (and un-share) the preloaded pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # gRPC channels are not fork-safe: every worker creates its own Firestore client
+    import app
+    app.init_db()
@@ -0,0 +1,317 @@
+"""Entry ingestion: Firestore documents -> normalized entry records.
+
+Every path that turns journals and echo messages into scoring input goes
+through here, so windowing, text cleanup and timestamp handling exist once:
+    {'text': stripped non-empty text, 'date': 'YYYY-MM-DD' (or an undated journal key), 'source': 'journal' | 'echo'}
+
+Fetched documents are kept in a TTL cache (FETCH_CACHE_TTL seconds,
+FETCH_CACHE_SIZE entries) so a /debug/users scan followed by an analysis, or
+repeated polling, does not read them again. An entry is dropped as soon as a
+change marker shows it is stale: a journal document's update_time, or the
+newest timestamp / count of the user's echo window (see revalidate_user,
+which everything that stores or serves an analysis as current runs first).
+Without a marker read (the debug listings), staleness is bounded by the TTL. Within a request, documents are additionally memoized so each is
+fetched at most once.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from queries import (echo_window_count, field_mask, journal_update_times, journal_window_refs, newest_echo_timestamp,
+                     user_echo_query, window_start_timestamp)
+from observability import count_reads, get_logger, span
+
+log = get_logger('ingestion')
+
+FETCH_CACHE_TTL = int(os.environ.get('FETCH_CACHE_TTL', 60))
+FETCH_CACHE_SIZE = int(os.environ.get('FETCH_CACHE_SIZE', 4096))
+# Threads for the echo marker queries read_change_markers sends alongside the journal get
+MARKER_READ_THREADS = int(os.environ.get('MARKER_READ_THREADS', 16))
+
+_request_memo = contextvars.ContextVar('request_fetch_memo', default=None)
+
+
+def start_request_cache():
+    """Memoize fetched documents for the rest of this request (called per request by the app)"""
+    _request_memo.set({})
+
+
+def end_request_cache():
+    """Drop the request's memo, so nothing run later on this thread sees its documents"""
+    _request_memo.set(None)
+
+
+class FetchCache:
+    """Thread-safe TTL + LRU cache of fetched documents with marker-based invalidation.
+
+    `version` must match on get (e.g. the field mask, which moves with the
+    window); `marker` is what observe() compares against fresher metadata.
+    """
+
+    def __init__(self, max_size=FETCH_CACHE_SIZE, ttl=FETCH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.request_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        memo = _request_memo.get()
+        with self._lock:
+            if memo is not None and (key, version) in memo:
+                self.request_hits += 1
+                return memo[(key, version)]
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] < self.ttl and item[1] == version:
+                self._items.move_to_end(key)
+                self.hits += 1
+                value = item[3]
+            else:
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+        if memo is not None:
+            memo[(key, version)] = value
+        return value
+
+    def put(self, key, value, version=None, marker=None):
+        memo = _request_memo.get()
+        if memo is not None:
+            memo[(key, version)] = value
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), version, marker, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def observe(self, key, marker):
+        """Drop `key` if its stored marker differs from this fresher one"""
+        memo = _request_memo.get()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[2] != marker:
+                del self._items[key]
+                self.invalidations += 1
+        if memo is not None:
+            for memo_key in [k for k in memo if k[0] == key]:
+                del memo[memo_key]
+
+    def discard(self, key):
+        memo = _request_memo.get()
+        with self._lock:
+            self._items.pop(key, None)
+        if memo is not None:
+            for memo_key in [k for k in memo if k[0] == key]:
+                del memo[memo_key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.request_hits + self.misses
+            return {
+                'hits': self.hits,
+                'request_hits': self.request_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits + self.request_hits) / total if total else 0.0,
+                'size': len(self._items),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+            }
+
+
+fetch_cache = FetchCache()
+
+
+# ===== NORMALIZATION =====
+def journal_texts(day_content):
+    """Stripped, non-empty journal texts of one logs day"""
+    if not isinstance(day_content, dict):
+        return []
+    texts = (j.get('text', '') for j in day_content.get('journals', []) if isinstance(j, dict))
+    return [t.strip() for t in texts if isinstance(t, str) and t.strip()]
+
+
+def echo_date(timestamp):
+    """Day key of an echo message (UTC, as Firestore returns timestamps).
+
+    Echo messages are read with a timestamp range query, so one without a
+    Firestore timestamp never gets here: it is not analyzed at all.
+    """
+    return timestamp.strftime('%Y-%m-%d')
+
+
+def _journal_key(journal):
+    return json.dumps(journal, sort_keys=True, default=str)
+
+
+def merge_journal_days(days, other):
+    """Add `other`'s {date_key: day_content} into `days` (in place).
+
+    A date present in both keeps every distinct journal of either copy, so a
+    journal written to one layout is never hidden by the other.
+    """
+    for date_key, day_content in other.items():
+        current = days.get(date_key)
+        if not isinstance(current, dict):
+            days[date_key] = day_content
+            continue
+        if not isinstance(day_content, dict):
+            continue
+        journals = list(current.get('journals') or [])
+        seen = {_journal_key(j) for j in journals}
+        for journal in day_content.get('journals') or []:
+            if _journal_key(journal) not in seen:
+                seen.add(_journal_key(journal))
+                journals.append(journal)
+        days[date_key] = {**day_content, **current, 'journals': journals}
+    return days
+
+
+def journal_entries(logs_data):
+    for date_key, day_content in (logs_data or {}).items():
+        for text in journal_texts(day_content):
+            yield {'text': text, 'date': date_key, 'source': 'journal'}
+
+
+def echo_entries(messages):
+    """Entries from echo messages ({'id', 'text', 'timestamp'} dicts, as fetch_echo_window returns)"""
+    for message in messages:
+        text = message.get('text', '')
+        if isinstance(text, str) and text.strip():
+            yield {'text': text.strip(), 'date': echo_date(message['timestamp']), 'source': 'echo'}
+
+
+def user_entries(db, user_id, today=None):
+    """All windowed entries of one user: journals first, then user echo messages"""
+    yield from journal_entries(fetch_journal_window(db, user_id, today))
+    yield from echo_entries(fetch_echo_window(db, user_id, today))
+
+
+# ===== CACHED FETCHES =====
+def _path(ref):
+    return ('doc',) + tuple(ref.path.split('/') if isinstance(ref.path, str) else ref.path)
+
+
+def fetch_journal_window(db, user_id, today=None):
+    """Journal days inside the window as {date_key: day_content}, from either layout.
+
+    Only the window's date keys are requested (field mask), from the legacy
+    logs document and from the month shards the window touches, in one
+    batched get, so cost is at most three small reads however old the
+    account is. A day present in both layouts gets the journals of both (see
+    merge_journal_days): clients keep writing to the logs document after its
+    days were migrated. Each document is cached until its update_time moves.
+    """
+    window = journal_window_refs(db, user_id, today)
+    found, missing = {}, []
+    with span('journals_fetch'):
+        for ref, keys in window:
+            data = fetch_cache.get(_path(ref), version=tuple(keys))
+            if data is None:
+                missing.append((ref, keys))
+            else:
+                found[_path(ref)] = data
+        if missing:
+            mask = field_mask(sorted({key for _, keys in missing for key in keys}))
+            docs = {doc.reference.path: doc for doc in db.get_all([ref for ref, _ in missing], field_paths=mask)}
+            for ref, keys in missing:
+                doc = docs.get(ref.path)
+                exists = doc is not None and doc.exists
+                data = {k: v for k, v in doc.to_dict().items() if k in keys} if exists else {}
+                fetch_cache.put(_path(ref), data, version=tuple(keys), marker=doc.update_time if exists else None)
+                found[_path(ref)] = data
+            count_reads('logs', len(missing))
+    days = {}
+    for ref, _ in window:
+        merge_journal_days(days, found[_path(ref)])
+    return days
+
+
+def _echo_marker(messages):
+    newest = max((m['timestamp'] for m in messages if m.get('timestamp') is not None), default=None)
+    return newest, len(messages)
+
+
+def fetch_echo_window(db, user_id, today=None, after=None):
+    """User echo messages inside the window as {'id', 'text', 'timestamp'} dicts, optionally only those at or after `after`.
+
+    `after` is inclusive, so messages sharing the caller's high-water mark come
+    back too and are told apart by id. The whole window is cached per user; an
+    `after` request is answered from it when present, otherwise it runs the
+    narrower incremental query.
+    """
+    key, since = ('echo', user_id), window_start_timestamp(today)
+    with span('echo_fetch'):
+        messages = fetch_cache.get(key, version=since)
+        if messages is None:
+            query_after = after if after is not None and after >= since else None
+            messages = [{**doc.to_dict(), 'id': doc.id}
+                        for doc in user_echo_query(db, user_id, after=query_after, today=today).stream()]
+            count_reads('echo', max(1, len(messages)))
+            if query_after is not None:
+                return messages
+            fetch_cache.put(key, messages, version=since, marker=_echo_marker(messages))
+    if after is None or after < since:
+        return messages
+    return [m for m in messages if m['timestamp'] >= after]
+
+
+def echo_window_total(db, user_id, today=None):
+    """User echo messages in the window: the count this request's change markers saw, else a count() query"""
+    memo, key = _request_memo.get(), (('echo_count', user_id), window_start_timestamp(today))
+    if memo is not None and key in memo:
+        return memo[key]
+    return echo_window_count(db, user_id, today)
+
+
+_marker_reads = ThreadPoolExecutor(max_workers=MARKER_READ_THREADS, thread_name_prefix='markers')
+
+
+def read_change_markers(db, user_id, today=None):
+    """(journal update_times, newest echo timestamp, echo count) for the ETag, dropping cached documents they show are stale.
+
+    The three reads are independent and sent concurrently, so this costs one
+    round trip rather than three.
+    """
+    # A context copy per task: spans and read counts still land in this request
+    newest = _marker_reads.submit(contextvars.copy_context().run, newest_echo_timestamp, db, user_id, today)
+    counted = _marker_reads.submit(contextvars.copy_context().run, echo_window_count, db, user_id, today)
+    journal_times = []
+    for ref, update_time in journal_update_times(db, user_id, today):
+        fetch_cache.observe(_path(ref), update_time)
+        journal_times.append(update_time)
+    newest_echo, echo_count = newest.result(), counted.result()
+    fetch_cache.observe(('echo', user_id), (newest_echo, echo_count))
+    memo = _request_memo.get()
+    if memo is not None:
+        memo[(('echo_count', user_id), window_start_timestamp(today))] = echo_count
+    return journal_times, newest_echo, echo_count
+
+
+def revalidate_user(db, user_id, today=None):
+    """Make this user's next fetches current: read_change_markers, or if that fails drop every cached document of theirs.
+
+    Call it before analyzing for anything that is stored or served as fresh.
+    Returns the markers, or None when they could not be read.
+    """
+    try:
+        return read_change_markers(db, user_id, today)
+    except Exception as e:
+        log.warning('change_markers_failed', extra={'user_id': user_id, 'error': str(e)})
+        for ref, _ in journal_window_refs(db, user_id, today):
+            fetch_cache.discard(_path(ref))
+        fetch_cache.discard(('echo', user_id))
+        return None
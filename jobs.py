@@ -0,0 +1,401 @@
+"""Background jobs with progress reporting and per-item checkpoints.
+
+A job is a row in a job store plus the checkpointed results of the items it
+has finished. Workers claim jobs from a queue (or, when it is idle, by
+scanning the store for queued jobs and running jobs whose owner stopped
+heartbeating; a running job heartbeats from its own thread, so one slow item
+does not make it look abandoned), so a job interrupted by a crash or a redeploy resumes and
+skips every item already checkpointed.
+
+Stores: MemoryJobStore (one process, tests) and SQLiteJobStore (survives
+restarts and is shared by all gunicorn workers on the host).
+"""
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+from observability import get_logger
+
+log = get_logger('jobs')
+
+JOB_FIELDS = ('id', 'kind', 'params', 'status', 'created_at', 'started_at', 'finished_at', 'heartbeat_at',
+              'owner', 'total', 'done', 'failed', 'run_start_count', 'error')
+
+
+def new_job(kind, params):
+    return {
+        'id': uuid.uuid4().hex, 'kind': kind, 'params': params or {}, 'status': 'queued',
+        'created_at': time.time(), 'started_at': None, 'finished_at': None, 'heartbeat_at': None,
+        'owner': None, 'total': None, 'done': 0, 'failed': 0, 'run_start_count': 0, 'error': None,
+    }
+
+
+def _claimable(job, now, stale_after):
+    return job['status'] == 'queued' or (
+        job['status'] == 'running' and (job['heartbeat_at'] or 0) < now - stale_after)
+
+
+# ===== STORES =====
+class MemoryJobStore:
+    """Jobs and checkpoints in process memory"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._checkpoints = {}  # job id -> {item id: (ok, result)}
+        self._lock = threading.Lock()
+
+    def create_job(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+            self._checkpoints[job['id']] = {}
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update_job(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def claim(self, job_id, owner, stale_after):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            now = time.time()
+            if job is None or not _claimable(job, now, stale_after):
+                return False
+            job.update(status='running', owner=owner, started_at=now, heartbeat_at=now, finished_at=None,
+                       error=None, run_start_count=job['done'] + job['failed'])
+            return True
+
+    def claimable_jobs(self, stale_after):
+        now = time.time()
+        with self._lock:
+            return [j['id'] for j in sorted(self._jobs.values(), key=lambda j: j['created_at'])
+                    if _claimable(j, now, stale_after)]
+
+    def has_active(self, kind):
+        with self._lock:
+            return any(j['kind'] == kind and j['status'] in ('queued', 'running') for j in self._jobs.values())
+
+    def add_checkpoints(self, job_id, rows):
+        """Record (item_id, ok, result) rows; items already recorded are ignored"""
+        with self._lock:
+            done = self._checkpoints[job_id]
+            job = self._jobs[job_id]
+            for item_id, ok, result in rows:
+                if item_id not in done:
+                    done[item_id] = (ok, result)
+                    job['done' if ok else 'failed'] += 1
+            job['heartbeat_at'] = time.time()
+
+    def completed_items(self, job_id):
+        with self._lock:
+            return set(self._checkpoints.get(job_id, ()))
+
+    def results(self, job_id, limit=100, after=None):
+        with self._lock:
+            items = sorted(self._checkpoints.get(job_id, {}).items())
+        return [result for item_id, (ok, result) in items if after is None or item_id > after][:limit]
+
+
+class SQLiteJobStore:
+    """Jobs and checkpoints in a local SQLite file (one connection per call, so any thread can use it)"""
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"CREATE TABLE IF NOT EXISTS jobs ({', '.join(JOB_FIELDS)}, PRIMARY KEY (id))")
+            conn.execute('CREATE TABLE IF NOT EXISTS checkpoints (job_id, item_id, ok, result, '
+                         'PRIMARY KEY (job_id, item_id))')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _row_to_job(row):
+        job = dict(zip(JOB_FIELDS, row))
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def create_job(self, job):
+        row = [json.dumps(job['params']) if f == 'params' else job[f] for f in JOB_FIELDS]
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"INSERT INTO jobs VALUES ({', '.join('?' * len(JOB_FIELDS))})", row)
+
+    def get_job(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update_job(self, job_id, **fields):
+        if 'params' in fields:
+            fields['params'] = json.dumps(fields['params'])
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self, job_id, owner, stale_after):
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            # Single UPDATE, so two processes can never both win the same job
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, started_at = ?, heartbeat_at = ?, finished_at = NULL, "
+                "error = NULL, run_start_count = done + failed WHERE id = ? AND (status = 'queued' OR "
+                "(status = 'running' AND COALESCE(heartbeat_at, 0) < ?))",
+                (owner, now, now, job_id, now - stale_after))
+            return cursor.rowcount == 1
+
+    def claimable_jobs(self, stale_after):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND "
+                "COALESCE(heartbeat_at, 0) < ?) ORDER BY created_at", (time.time() - stale_after,)).fetchall()
+        return [row[0] for row in rows]
+
+    def has_active(self, kind):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM jobs WHERE kind = ? AND status IN ('queued', 'running') LIMIT 1",
+                                (kind,)).fetchone() is not None
+
+    def add_checkpoints(self, job_id, rows):
+        """Record (item_id, ok, result) rows; items already recorded are ignored"""
+        done = failed = 0
+        with closing(self._connect()) as conn, conn:
+            for item_id, ok, result in rows:
+                cursor = conn.execute('INSERT OR IGNORE INTO checkpoints VALUES (?, ?, ?, ?)',
+                                      (job_id, item_id, int(ok), json.dumps(result)))
+                if cursor.rowcount:
+                    done, failed = (done + 1, failed) if ok else (done, failed + 1)
+            conn.execute('UPDATE jobs SET done = done + ?, failed = failed + ?, heartbeat_at = ? WHERE id = ?',
+                         (done, failed, time.time(), job_id))
+
+    def completed_items(self, job_id):
+        with closing(self._connect()) as conn:
+            return {row[0] for row in conn.execute('SELECT item_id FROM checkpoints WHERE job_id = ?', (job_id,))}
+
+    def results(self, job_id, limit=100, after=None):
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT result FROM checkpoints WHERE job_id = ? AND item_id > ? '
+                                'ORDER BY item_id LIMIT ?', (job_id, after or '', limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+def make_job_store(kind, path=None):
+    """'memory' or 'sqlite' (at `path`)"""
+    if kind == 'memory':
+        return MemoryJobStore()
+    if kind == 'sqlite':
+        return SQLiteJobStore(path)
+    raise ValueError(f"Unknown job store: {kind}")
+
+
+# ===== QUEUE =====
+class MemoryJobQueue:
+    """In-process hand-off of new job ids to the workers of this process"""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def put(self, job_id):
+        self._queue.put(job_id)
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+# ===== RUNNER =====
+class JobContext:
+    """What a job handler sees: its params, what is already done, and where to checkpoint"""
+
+    def __init__(self, store, job):
+        self.store = store
+        self.job_id = job['id']
+        self.params = job['params']
+        self.completed = store.completed_items(job['id'])
+
+    def save_params(self):
+        """Persist changes to params (e.g. a resolved item list) so a resumed run sees them"""
+        self.store.update_job(self.job_id, params=self.params)
+
+    def set_total(self, total):
+        self.store.update_job(self.job_id, total=total)
+
+    def checkpoint(self, rows):
+        """Persist finished (item_id, ok, result) rows (this also refreshes the heartbeat)"""
+        self.store.add_checkpoints(self.job_id, rows)
+        self.completed.update(item_id for item_id, _, _ in rows)
+
+
+class JobRunner:
+    """Runs registered job kinds on background threads, separate from request threads.
+
+    Threads start on the first start() call in each process (never in a
+    preloading master). Idle workers poll the store every `poll_interval`
+    seconds, which picks up jobs queued by other processes and jobs whose
+    owner has not heartbeated for `stale_after` seconds. A running job
+    heartbeats every `heartbeat_interval` seconds (default stale_after / 4).
+
+    `store` may also be a callable returning one, created on first use, so
+    merely importing the app opens no database.
+    """
+
+    def __init__(self, store, job_queue=None, workers=1, poll_interval=5.0, stale_after=300.0,
+                 heartbeat_interval=None):
+        self._store = store
+        self._store_lock = threading.Lock()
+        self.queue = job_queue or MemoryJobQueue()
+        self.workers = max(1, int(workers))
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.heartbeat_interval = heartbeat_interval or stale_after / 4
+        self.handlers = {}
+        self.schedules = []  # (interval seconds, kind, params)
+        self._pid = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def store(self):
+        if callable(self._store):
+            with self._store_lock:
+                if callable(self._store):
+                    self._store = self._store()
+        return self._store
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def every(self, interval, kind, params=None):
+        """Submit `kind` every `interval` seconds unless one is already queued or running"""
+        self.schedules.append((interval, kind, params))
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True).start()
+            for interval, kind, params in self.schedules:
+                threading.Thread(target=self._schedule, args=(interval, kind, params),
+                                 name=f'job-schedule-{kind}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+
+    def submit(self, kind, params=None, unique=False):
+        """Queue a job and return its id; with unique=True returns None if one of this kind is active"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if unique and self.store.has_active(kind):
+            return None
+        job = new_job(kind, params)
+        self.store.create_job(job)
+        self.queue.put(job['id'])
+        self.start()
+        return job['id']
+
+    def resume(self, job_id):
+        """Requeue a failed job; it continues after its last checkpoint. False if it is not failed."""
+        job = self.store.get_job(job_id)
+        if job is None or job['status'] != 'failed':
+            return False
+        self.store.update_job(job_id, status='queued')
+        self.queue.put(job_id)
+        self.start()
+        return True
+
+    def _schedule(self, interval, kind, params):
+        # Every process runs this; has_active() keeps them from stacking up duplicate jobs
+        while not self._stop.wait(interval):
+            try:
+                self.submit(kind, dict(params or {}), unique=True)
+            except Exception as e:
+                log.warning('job_schedule_failed', extra={'kind': kind, 'error': str(e)})
+
+    def _owner(self):
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+    def _work(self):
+        while not self._stop.is_set():
+            job_id = self.queue.get(timeout=self.poll_interval)
+            job_ids = [job_id] if job_id else self.store.claimable_jobs(self.stale_after)
+            for job_id in job_ids:
+                if self._stop.is_set():
+                    return
+                if self.store.claim(job_id, self._owner(), self.stale_after):
+                    self._run(self.store.get_job(job_id))
+
+    def _run(self, job):
+        log.info('job_started', extra={'job_id': job['id'], 'kind': job['kind'], 'resumed_at': job['run_start_count']})
+        try:
+            with self._heartbeat(job['id']):
+                self.handlers[job['kind']](JobContext(self.store, job))
+        except Exception as e:
+            log.exception('job_failed', extra={'job_id': job['id'], 'error': str(e)})
+            self.store.update_job(job['id'], status='failed', error=str(e), finished_at=time.time())
+            return
+        self.store.update_job(job['id'], status='completed', finished_at=time.time())
+        log.info('job_completed', extra={'job_id': job['id']})
+
+    @contextmanager
+    def _heartbeat(self, job_id):
+        """Refresh heartbeat_at on a timer while the job runs, however long one item takes"""
+        finished = threading.Event()
+
+        def beat():
+            while not finished.wait(self.heartbeat_interval):
+                try:
+                    self.store.update_job(job_id, heartbeat_at=time.time())
+                except Exception as e:
+                    log.warning('job_heartbeat_failed', extra={'job_id': job_id, 'error': str(e)})
+
+        thread = threading.Thread(target=beat, name=f'job-heartbeat-{job_id[:8]}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            finished.set()
+            thread.join()
+
+
+def job_progress(job):
+    """Public view of a job: counts, timestamps and an ETA from this run's throughput"""
+    processed = job['done'] + job['failed']
+    eta = None
+    if job['status'] == 'running' and job['total'] is not None and job['started_at']:
+        ran = processed - job['run_start_count']
+        elapsed = time.time() - job['started_at']
+        if ran > 0 and elapsed > 0:
+            eta = round(max(0, job['total'] - processed) * elapsed / ran, 1)
+    stamp = lambda t: time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(t)) if t else None
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'total': job['total'],
+        'done': job['done'],
+        'failed': job['failed'],
+        'remaining': None if job['total'] is None else max(0, job['total'] - processed),
+        'resumed_from': job['run_start_count'],
+        'eta_seconds': eta,
+        'created_at': stamp(job['created_at']),
+        'started_at': stamp(job['started_at']),
+        'finished_at': stamp(job['finished_at']),
+        'error': job['error'],
+    }
@@ -0,0 +1,164 @@
+"""Real-time scoring of single messages.
+
+A new message is scored on its own and added to a provisional `live_days`
+aggregate in the user's analysis_state document with Firestore Increment
+transforms: one write, no read-modify-write, no re-analysis. The crisis
+flag and levels are then re-derived from the stored day aggregates plus the
+live ones.
+
+live_days is an overlay, not a source of truth: the next incremental
+analysis scores the persisted message itself and clears the overlay, so
+nothing is counted twice.
+
+Run `python live_scoring.py` to score user echo messages as they are
+written, via an on_snapshot listener (one process per deployment).
+"""
+from datetime import datetime, timezone
+from firebase_admin import firestore
+from analyzer import (classify_daily_aggregates, count_keyword_categories, current_model_version, get_sentiment,
+                      merge_daily_aggregates, pinned_model, prune_daily_aggregates, window_start)
+from analysis_state import STATE_VERSION, save_latest, state_ref, window_entry_count
+from observability import count_reads, get_logger, span
+
+log = get_logger('live_scoring')
+
+# Result fields that decide whether the materialized latest analysis must be rewritten
+LEVEL_FIELDS = ('depression_level', 'anxiety_level', 'risk_level', 'negative_days', 'total_days_analyzed',
+                'crisis_detected')
+
+
+def message_date(timestamp=None, date=None):
+    """Day key of a message: explicit YYYY-MM-DD, else the (UTC) day of its timestamp, else today.
+
+    Raises ValueError for values of any other type or format (e.g. epoch numbers).
+    """
+    if date:
+        if not isinstance(date, str):
+            raise ValueError(f"date must be a YYYY-MM-DD string, not {type(date).__name__}")
+        return datetime.strptime(date, '%Y-%m-%d').date()
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    elif timestamp is not None and not isinstance(timestamp, datetime):
+        raise ValueError(f"timestamp must be an ISO 8601 string, not {type(timestamp).__name__}")
+    timestamp = timestamp or datetime.now(timezone.utc)
+    # The UTC day, as ingestion.echo_date files the same message on the next analysis
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date()
+
+
+def score_message(text):
+    """One message as a day-aggregate delta"""
+    with span('live_score'):
+        dep, anx, sui = count_keyword_categories(text)
+        return {
+            'sentiment_sum': int(get_sentiment(text)),
+            'sentiment_count': 1,
+            'dep_keywords': dep,
+            'anx_keywords': anx,
+            'sui_keywords': sui,
+        }
+
+
+def add_live_score(db, user_id, day, delta):
+    """Add `delta` to live_days[day] atomically (works on a missing document too)"""
+    with span('live_save'):
+        state_ref(db, user_id).set({
+            'live_days': {str(day): {k: firestore.Increment(v) for k, v in delta.items()}}
+        }, merge=True)
+
+
+def live_result(state, today=None):
+    """Classification over the stored days plus the live overlay.
+
+    A state document from another format or model version only contributes
+    its live days; the stored aggregates are rebuilt on the next analysis.
+    """
+    valid = state.get('version') == STATE_VERSION and state.get('model_version') == current_model_version()
+    daily = {}
+    sources = ('journal_days', 'undated_journal_days', 'echo_days', 'live_days') if valid else ('live_days',)
+    for name in sources:
+        merge_daily_aggregates(daily, state.get(name) or {})
+    live_entries = sum(day['sentiment_count'] for day in prune_daily_aggregates(state.get('live_days') or {}, today).values())
+    stored_entries = window_entry_count(state, today) if valid else 0
+
+    results = classify_daily_aggregates(prune_daily_aggregates(daily, today))
+    results['total_entries'] = stored_entries + live_entries
+    results['live_entries'] = live_entries
+    return results
+
+
+def score_new_message(db, user_id, text, timestamp=None, date=None):
+    """Score one message into the user's live aggregates and return the updated classification.
+
+    Returns None for messages outside the analysis window (nothing is written).
+    The materialized latest analysis is rewritten only when a level or the
+    crisis flag changed.
+    """
+    day = message_date(timestamp, date)
+    if day < window_start() or not text.strip():
+        return None
+
+    delta = score_message(text.strip())
+    add_live_score(db, user_id, day, delta)
+
+    # Read after the increment, so concurrent scores for this user are included
+    with span('state_load'):
+        doc = state_ref(db, user_id).get()
+    count_reads('state')
+    state = doc.to_dict() if doc.exists else {}
+
+    results = live_result(state)
+    results.update({
+        'status': 'success',
+        'user_id': user_id,
+        'analyzed_at': datetime.now().isoformat(),
+        'model_version': current_model_version(),
+    })
+    # Levels last materialized: by an earlier live score, else by the last full analysis
+    previous = state.get('live_levels') or state.get('latest_result') or {}
+    if any(previous.get(k) != results[k] for k in LEVEL_FIELDS):
+        save_latest(db, user_id, results)
+        state_ref(db, user_id).set({'live_levels': {k: results[k] for k in LEVEL_FIELDS}}, merge=True)
+        if results['crisis_detected'] and not previous.get('crisis_detected'):
+            log.warning('crisis_detected', extra={'user_id': user_id, 'date': str(day)})
+    return {'date': str(day), 'scores': delta, **results}
+
+
+def start_echo_listener(db):
+    """Score every new user echo message as it is written (collection group on_snapshot)"""
+    # Only messages written from now on, so the first snapshot does not replay history.
+    # Needs the echo_history collection group index from firestore.indexes.json.
+    query = (db.collection_group('echo_history')
+             .where(filter=firestore.FieldFilter('sender', '==', 'user'))
+             .where(filter=firestore.FieldFilter('timestamp', '>=', datetime.now(timezone.utc))))
+
+    def on_snapshot(snapshots, changes, read_time):
+        for change in changes:
+            if change.type.name != 'ADDED':
+                continue
+            data = change.document.to_dict()
+            timestamp = data.get('timestamp')
+            user_id = change.document.reference.parent.parent.id
+            try:
+                with pinned_model():
+                    score_new_message(db, user_id, data.get('text', ''), timestamp=timestamp)
+            except Exception as e:
+                log.warning('live_score_failed', extra={'user_id': user_id, 'error': str(e)})
+
+    return query.on_snapshot(on_snapshot)
+
+
+if __name__ == '__main__':
+    import threading
+    import app
+    from observability import configure_logging
+    configure_logging()
+    if app.init_db() is None:
+        raise SystemExit(f"Firestore unavailable: {app.db_error}")
+    watch = start_echo_listener(app.db)
+    log.info('echo_listener_started')
+    try:
+        threading.Event().wait()
+    finally:
+        watch.unsubscribe()
@@ -0,0 +1,101 @@
+"""Move journals from users/{id}/data/logs into per-month journal_months documents.
+
+    python migrate_logs.py                      # copy every user's journals
+    python migrate_logs.py --delete-source      # ...and remove the copied dates from logs
+    python migrate_logs.py --user abc --dry-run
+
+Safe to re-run: each day's journals are added to its month document with
+ArrayUnion, so journals written to logs since the last run are copied
+without losing those already in the shard. Readers merge a day's journals
+from both layouts, so the app keeps working while a migration is in
+progress and while clients still write to the logs document (including to
+days that were already migrated and deleted from it).
+"""
+import argparse
+from itertools import groupby
+from google.api_core.exceptions import FailedPrecondition
+from firebase_admin import firestore
+from analyzer import parse_entry_date
+from queries import field_mask, journal_month_ref, logs_ref
+from workers import bounded_map
+
+DELETE_RETRIES = 3
+
+
+def shard_day(day_content):
+    """A logs day as a merge write: journals are unioned with the shard's, not replaced"""
+    journals = day_content.get('journals')
+    if not isinstance(journals, list):
+        return day_content
+    return {**day_content, 'journals': firestore.ArrayUnion(journals)}
+
+
+def migrate_user(db, user_id, delete_source=False, dry_run=False):
+    """Copy one user's dated journal days into month shards; returns (days, months)"""
+    for attempt in range(DELETE_RETRIES):
+        doc = logs_ref(db, user_id).get()
+        if not doc.exists:
+            return 0, 0
+        logs = doc.to_dict()
+        dated = sorted(key for key in logs if isinstance(logs[key], dict) and parse_entry_date(key) is not None)
+        by_month = {month: list(keys) for month, keys in groupby(dated, key=lambda key: key[:7])}
+        if dry_run or not dated:
+            return len(dated), len(by_month)
+
+        for month, keys in by_month.items():
+            journal_month_ref(db, user_id, month).set({key: shard_day(logs[key]) for key in keys}, merge=True)
+        if not delete_source:
+            return len(dated), len(by_month)
+
+        # Only delete if nobody wrote to logs since it was read; otherwise copy again
+        try:
+            logs_ref(db, user_id).update({path: firestore.DELETE_FIELD for path in field_mask(dated)},
+                                         option=db.write_option(last_update_time=doc.update_time))
+            return len(dated), len(by_month)
+        except FailedPrecondition:
+            if attempt == DELETE_RETRIES - 1:
+                raise
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', action='append', dest='users', help="migrate only this user (repeatable)")
+    parser.add_argument('--delete-source', action='store_true', help="remove migrated dates from the logs document")
+    parser.add_argument('--dry-run', action='store_true', help="only report what would be copied")
+    parser.add_argument('--workers', type=int, default=8)
+    return parser.parse_args(argv)
+
+
+def main(argv=None, db=None):
+    args = parse_args(argv)
+    if db is None:
+        import app
+        db = app.init_db()
+        if db is None:
+            raise SystemExit(f"Firestore unavailable: {app.db_error}")
+
+    user_ids = args.users or (ref.id for ref in db.collection('users').list_documents())
+
+    def migrate(user_id):
+        try:
+            return user_id, migrate_user(db, user_id, args.delete_source, args.dry_run), None
+        except Exception as e:
+            return user_id, (0, 0), e
+
+    users = days = months = failed = 0
+    for user_id, (user_days, user_months), error in bounded_map(migrate, user_ids, max_workers=args.workers):
+        if error is not None:
+            failed += 1
+            print(f"❌ {user_id}: {error}")
+            continue
+        users += 1
+        days += user_days
+        months += user_months
+
+    action = 'Would copy' if args.dry_run else 'Copied'
+    print(f"✅ {action} {days} journal days into {months} month documents for {users} users ({failed} failed)")
+    return failed
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if main() else 0)
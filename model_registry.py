@@ -0,0 +1,112 @@
+"""Versioned model artifacts on disk.
+
+models/registry/<version>/ holds one trained model (svm_model.pkl,
+vectorizer.pkl and, when exportable, linear_model.bin) plus manifest.json:
+    {"version", "created_at", "files": {name: sha256}, "metrics": {...}}
+models/registry/CURRENT names the version to serve.
+
+Versions are immutable: publish() writes to a temporary directory and
+renames it into place, and CURRENT is swapped with os.replace, so a reader
+never sees a half-written version. Without a registry the app serves the
+legacy files in models/ directly.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', os.path.join(MODELS_DIR, 'registry'))
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+ARTIFACTS = ('svm_model.pkl', 'vectorizer.pkl', 'linear_model.bin')
+VERSION_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def version_dir(version, registry_dir=REGISTRY_DIR):
+    if not VERSION_RE.match(version or ''):
+        raise ValueError(f"Invalid model version: {version!r}")
+    return os.path.join(registry_dir, version)
+
+
+def publish(source_dir, version, metrics=None, registry_dir=REGISTRY_DIR):
+    """Copy the artifacts in `source_dir` into the registry as `version`; returns the manifest"""
+    target = version_dir(version, registry_dir)
+    if os.path.exists(target):
+        raise ValueError(f"Model version {version} is already registered")
+    files = [name for name in ARTIFACTS if os.path.exists(os.path.join(source_dir, name))]
+    if 'linear_model.bin' not in files and not {'svm_model.pkl', 'vectorizer.pkl'} <= set(files):
+        raise ValueError(f"No model artifacts in {source_dir}")
+
+    os.makedirs(registry_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f'.{version}-', dir=registry_dir)
+    try:
+        for name in files:
+            shutil.copy2(os.path.join(source_dir, name), os.path.join(staging, name))
+        manifest = {
+            'version': version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'files': {name: sha256_file(os.path.join(staging, name)) for name in files},
+            'metrics': metrics or {},
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def read_manifest(version, registry_dir=REGISTRY_DIR):
+    with open(os.path.join(version_dir(version, registry_dir), MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def verify(version, registry_dir=REGISTRY_DIR):
+    """Manifest of `version` after checking every artifact against its checksum"""
+    manifest = read_manifest(version, registry_dir)
+    directory = version_dir(version, registry_dir)
+    for name, checksum in manifest['files'].items():
+        if sha256_file(os.path.join(directory, name)) != checksum:
+            raise ValueError(f"Checksum mismatch for {name} in model version {version}")
+    return manifest
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Manifests of all registered versions, oldest first"""
+    if not os.path.isdir(registry_dir):
+        return []
+    manifests = []
+    for name in os.listdir(registry_dir):
+        if VERSION_RE.match(name) and os.path.exists(os.path.join(registry_dir, name, MANIFEST_FILE)):
+            manifests.append(read_manifest(name, registry_dir))
+    return sorted(manifests, key=lambda m: m['created_at'])
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(version, registry_dir=REGISTRY_DIR):
+    """Point CURRENT at a verified version (atomic rename)"""
+    verify(version, registry_dir)
+    fd, tmp = tempfile.mkstemp(prefix='.CURRENT-', dir=registry_dir)
+    with os.fdopen(fd, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, os.path.join(registry_dir, CURRENT_FILE))
@@ -0,0 +1,211 @@
+"""Hot-path instrumentation: timed spans, Prometheus-style metrics and buffered JSON logs.
+
+Metrics live in process memory. Under gunicorn every worker keeps its own
+registry, so /metrics describes the worker that answered the scrape.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# ===== METRICS =====
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = [f'{n}="{v}"' for n, v in zip(labelnames, key)] + [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram('stage_duration_seconds', 'Time spent per analysis stage', ['stage'])
+STAGE_ERRORS = Counter('stage_errors_total', 'Exceptions raised per analysis stage', ['stage'])
+ENTRIES_SCORED = Counter('entries_scored_total', 'Entries run through sentiment and keyword scoring')
+DOCS_READ = Counter('firestore_documents_read_total', 'Firestore documents read (billed reads)', ['source'])
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'HTTP request latency', ['endpoint', 'status'])
+
+REGISTRY = [STAGE_SECONDS, STAGE_ERRORS, ENTRIES_SCORED, DOCS_READ, REQUEST_SECONDS]
+
+
+def render_metrics(extra_lines=()):
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
+
+
+def count_reads(source, n=1):
+    DOCS_READ.inc(n, source=source)
+
+
+# ===== SPANS + SERVER-TIMING =====
+# Per-request list of (stage, seconds); None outside a request. asyncio.to_thread
+# copies the context, so spans in the async endpoint's worker threads are included.
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request_timings():
+    _request_timings.set([])
+
+
+def request_timings():
+    return _request_timings.get() or []
+
+
+@contextmanager
+def span(stage):
+    """Time a stage into the histogram (and the current request's Server-Timing)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing_header(timings):
+    """Server-Timing value; repeated stages (e.g. one per user) are summed"""
+    totals = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+# ===== STRUCTURED, BUFFERED LOGGING =====
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event and any `extra` fields"""
+
+    def format(self, record):
+        payload = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        payload.update({k: v for k, v in vars(record).items() if k not in _RESERVED})
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class BufferedHandler(logging.handlers.QueueHandler):
+    """Formats on the calling thread, writes to the stream from a background thread.
+
+    The listener is (re)started lazily per process, so a handler configured in a
+    preloading gunicorn master also works in the forked workers.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(logging.Formatter('%(message)s'))
+        self._target = target
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.setFormatter(JsonFormatter())
+
+    def _ensure_listener(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(self.queue, self._target)
+            listener.start()
+            atexit.register(listener.stop)
+            self._pid = os.getpid()
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._ensure_listener()
+        super().emit(record)
+
+
+_configured = False
+
+
+def configure_logging(level=None):
+    """Route the app's loggers through one buffered JSON handler (idempotent)"""
+    global _configured
+    if _configured:
+        return
+    root = logging.getLogger('liberate')
+    root.setLevel(level or os.environ.get('LOG_LEVEL', 'INFO'))
+    root.addHandler(BufferedHandler())
+    root.propagate = False
+    _configured = True
+
+
+def get_logger(name):
+    return logging.getLogger(f'liberate.{name}')
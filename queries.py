@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from analyzer import WINDOW_DAYS, window_start
+from observability import count_reads
+
+# Only these fields are used for scoring, so nothing else is sent over the wire
+ECHO_FIELDS = ['text', 'timestamp']
+
+
+def user_ref(db, user_id):
+    return db.collection('users').document(user_id)
+
+
+def logs_ref(db, user_id):
+    return user_ref(db, user_id).collection('data').document('logs')
+
+
+def journal_month_ref(db, user_id, month):
+    """Date-sharded journals: one document per YYYY-MM, keyed by date like the logs document"""
+    return user_ref(db, user_id).collection('journal_months').document(month)
+
+
+def user_ids_page(db, limit, page_token=None):
+    """Up to `limit` user ids, plus the token of the next page (None after the last).
+
+    Same ListDocuments call as CollectionReference.list_documents (show_missing,
+    so users that only have subcollections are listed too), but only one page
+    per call, resuming from `page_token`. The client library does not expose
+    page tokens, so the request goes through its GAPIC client.
+    """
+    users = db.collection('users')
+    parent, _ = users._parent_info()
+    pager = db._firestore_api.list_documents(request={
+        'parent': parent,
+        'collection_id': users.id,
+        'page_size': limit,
+        'page_token': page_token or '',
+        'show_missing': True,
+        'mask': {'field_paths': []},
+    }, metadata=db._rpc_metadata)
+    page = next(iter(pager.pages))
+    return [doc.name.rsplit('/', 1)[-1] for doc in page.documents], page.next_page_token or None
+
+
+def echo_ref(db, user_id):
+    return user_ref(db, user_id).collection('echo_history')
+
+
+def window_start_timestamp(today=None):
+    """Start of the analysis window as a UTC timestamp, comparable with Firestore timestamps"""
+    return datetime.combine(window_start(today), datetime.min.time(), tzinfo=timezone.utc)
+
+
+def user_echo_query(db, user_id, after=None, today=None):
+    """User-sent echo messages inside the window, text and timestamp only.
+
+    Filtering happens in Firestore, so reads grow with the window and not with
+    lifetime chat volume. Pass `after` to only get messages at or after it
+    (inclusive: messages sharing a timestamp with it are told apart by id).
+    Needs the (sender, timestamp) composite index from firestore.indexes.json.
+    """
+    since = window_start_timestamp(today)
+    query = echo_ref(db, user_id).where(filter=firestore.FieldFilter('sender', '==', 'user'))
+    if after is not None and after >= since:
+        query = query.where(filter=firestore.FieldFilter('timestamp', '>=', after))
+    else:
+        query = query.where(filter=firestore.FieldFilter('timestamp', '>=', since))
+    return query.select(ECHO_FIELDS)
+
+
+def window_date_keys(today=None):
+    """Date keys that can hold windowed journals: window start through tomorrow (client clock skew)"""
+    start = window_start(today)
+    return [str(start + timedelta(days=i)) for i in range(WINDOW_DAYS + 2)]
+
+
+def field_mask(keys):
+    """Date keys as field paths (quoted, since they contain '-')"""
+    return [FieldPath(key).to_api_repr() for key in keys]
+
+
+def journal_window_refs(db, user_id, today=None):
+    """(document, date keys) pairs holding the window's journals: legacy logs, then month shards"""
+    keys = window_date_keys(today)
+    refs = [(logs_ref(db, user_id), keys)]
+    for month, month_keys in groupby(keys, key=lambda key: key[:7]):
+        refs.append((journal_month_ref(db, user_id, month), list(month_keys)))
+    return refs
+
+
+def journal_update_times(db, user_id, today=None):
+    """(document, update_time) for each window journal document (None if missing).
+
+    One batched get with an empty mask, so no content is sent.
+    """
+    refs = [ref for ref, _ in journal_window_refs(db, user_id, today)]
+    times = {doc.reference.path: doc.update_time if doc.exists else None
+             for doc in db.get_all(refs, field_paths=[])}
+    count_reads('markers', len(refs))
+    return [(ref, times.get(ref.path)) for ref in refs]
+
+
+def user_echo_window(db, user_id, today=None):
+    """All user-sent echo messages inside the window (no field selection)"""
+    return (echo_ref(db, user_id)
+            .where(filter=firestore.FieldFilter('sender', '==', 'user'))
+            .where(filter=firestore.FieldFilter('timestamp', '>=', window_start_timestamp(today))))
+
+
+def newest_echo_timestamp(db, user_id, today=None):
+    """Timestamp of the newest user echo message in the window, or None.
+
+    Needs the (sender, timestamp DESC) index from firestore.indexes.json.
+    """
+    newest = list(user_echo_window(db, user_id, today).order_by('timestamp', direction=firestore.Query.DESCENDING)
+                  .limit(1).select(['timestamp']).stream())
+    count_reads('markers')
+    return newest[0].get('timestamp') if newest else None
+
+
+def echo_window_count(db, user_id, today=None):
+    """User echo messages in the window; catches deletions and late backfills that do not move the newest timestamp"""
+    return count(user_echo_window(db, user_id, today))
+
+
+def count(query):
+    """Server-side count() aggregation: costs one read per 1000 matches, no documents downloaded"""
+    value = int(query.count().get()[0][0].value)
+    count_reads('count', max(1, -(-value // 1000)))
+    return value
+
+
+def echo_counts(db, user_id):
+    """(all echo messages, user-sent echo messages) via aggregation queries"""
+    ref = echo_ref(db, user_id)
+    user_only = ref.where(filter=firestore.FieldFilter('sender', '==', 'user'))
+    return count(ref), count(user_only)
@@ -0,0 +1,67 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def fingerprint(*parts):
+    """Stable short hash of the inputs an analysis result depends on"""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(repr(part).encode('utf-8'))
+        h.update(b'\x1f')
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Thread-safe in-process LRU with a TTL, counting hits and misses"""
+
+    def __init__(self, max_size=1024, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.persisted_hits = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] < self.ttl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return dict(item[1])
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic(), dict(value))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def record_persisted_hit(self):
+        """Count an in-process miss that was served from the persisted copy instead"""
+        with self._lock:
+            self.persisted_hits += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'persisted_hits': self.persisted_hits,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._items),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+            }
@@ -0,0 +1,113 @@
+"""Scoring executors: where analyzer.score_texts runs.
+
+Text cleaning, the model and keyword matching are CPU-bound Python, so
+threads (gunicorn gthread workers, the analyze-all pipeline) take turns on
+the GIL. ProcessScoringExecutor sends large batches to a pool of processes
+instead:
+
+- workers are spawned (not forked: the parent has gRPC and logging threads)
+  and load the served model once, via their initializer;
+- a batch is split into a few chunks per worker; only the texts go out and
+  two small integer arrays come back;
+- batches below `min_batch` texts are scored in the calling thread, where
+  the pool's round trip would cost more than it saves;
+- after a model hot swap the pool is replaced, so workers never score with
+  a version other than the caller's.
+
+Install one with analyzer.set_scoring_executor(make_scoring_executor(...)).
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import analyzer
+from observability import get_logger, span
+
+log = get_logger('scoring')
+
+
+class ThreadScoringExecutor:
+    """Scores in the calling thread (the default behaviour)"""
+
+    def score(self, texts):
+        return analyzer.score_texts(texts)
+
+    def shutdown(self):
+        pass
+
+
+def _init_worker(version):
+    # Importing analyzer loaded the registry's CURRENT model; match the parent if it differs
+    if analyzer.current_model_version() != version:
+        analyzer.reload_model(version)
+
+
+def _score_chunk(texts):
+    sentiments, keywords = analyzer.score_texts(texts)
+    return sentiments.astype(np.int8), keywords.astype(np.int32)
+
+
+class ProcessScoringExecutor:
+    """Scores large batches on a process pool, small ones in the calling thread"""
+
+    def __init__(self, processes=None, min_batch=2000, min_chunk=250):
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.min_batch = min_batch
+        self.min_chunk = min_chunk
+        self._pool = None
+        self._pool_key = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self, version):
+        # One pool per process and model version (a gunicorn worker never reuses its master's)
+        key = (os.getpid(), version)
+        with self._lock:
+            if self._pool_key != key:
+                if self._pool is not None and self._pool_key[0] == os.getpid():
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_worker, initargs=(version,))
+                self._pool_key = key
+                log.info('scoring_pool_started', extra={'processes': self.processes, 'model_version': version})
+            return self._pool
+
+    def _discard_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool, self._pool_key = None, None
+
+    def score(self, texts):
+        if len(texts) < self.min_batch or self.processes < 2:
+            return analyzer.score_texts(texts)
+        # Fails here with ModelUnavailable rather than inside a worker
+        version = analyzer.require_model().version
+        pool = self._get_pool(version)
+        size = max(self.min_chunk, -(-len(texts) // (4 * self.processes)))
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        try:
+            with span('score_pool'):
+                parts = list(pool.map(_score_chunk, chunks))
+        except BrokenProcessPool as e:
+            log.warning('scoring_pool_broken', extra={'error': str(e)})
+            self._discard_pool(pool)
+            return analyzer.score_texts(texts)
+        sentiments = np.concatenate([p[0] for p in parts]).astype(np.int64)
+        keywords = np.concatenate([p[1] for p in parts]).astype(np.int64).reshape(-1, 3)
+        return sentiments, keywords
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_key[0] == os.getpid():
+                self._pool.shutdown()
+            self._pool, self._pool_key = None, None
+
+
+def make_scoring_executor(backend='thread', processes=None, min_batch=2000):
+    """'thread' = in the calling thread, 'process' = process pool for large batches"""
+    if backend == 'thread':
+        return ThreadScoringExecutor()
+    if backend == 'process':
+        return ProcessScoringExecutor(processes, min_batch)
+    raise ValueError(f"Unknown scoring backend: {backend!r}")
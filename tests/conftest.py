@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_firestore import FakeFirestore  # noqa: E402
+from ingestion import fetch_cache  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Empty in-memory Firestore; the process-wide fetch cache starts empty too"""
+    fetch_cache.clear()
+    yield FakeFirestore()
+    fetch_cache.clear()
@@ -0,0 +1,93 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from analyzer import (ANXIETY_KEYWORDS, DEPRESSION_KEYWORDS, SUICIDAL_KEYWORDS, KeywordMatcher, LinearScorer,
+                      SklearnScorer, analyze_entries, analyze_entries_batch, count_keyword_categories, count_keywords,
+                      preprocess_text)
+from benchmarks.corpus import make_text
+
+EDGE_TEXTS = ['', 'a', 'zzzz qqqq', 'sad sad sad sad', 'i feel happy, grateful and calm!!!',
+              'https://example.com i want to die', 'heart racing and cant breathe', 'SAD SAD sad']
+
+
+@pytest.fixture(scope='module')
+def scorers():
+    return LinearScorer(), SklearnScorer()
+
+
+def test_linear_scorer_matches_sklearn_on_committed_models(scorers):
+    linear, sklearn = scorers
+    assert linear.version == sklearn.version
+    rng = random.Random(0)
+    texts = EDGE_TEXTS + [make_text(rng, rng.randint(1, 80), 0.2) for _ in range(500)]
+    texts += [preprocess_text(text) for text in texts]
+
+    expected = sklearn.model.decision_function(sklearn.vectorizer.transform(texts))
+    np.testing.assert_allclose(linear.decision_function(texts), expected, rtol=1e-9, atol=1e-12)
+    assert (linear.predict(texts) == sklearn.predict(texts)).all()
+
+
+def per_category(text):
+    return tuple(count_keywords(text, keywords) for keywords in (DEPRESSION_KEYWORDS, ANXIETY_KEYWORDS,
+                                                                 SUICIDAL_KEYWORDS))
+
+
+@pytest.mark.parametrize('text', EDGE_TEXTS + [
+    'my heart racing again', 'racing thoughts', 'i want to end it', 'i want to end it all',
+    'end it all, end it', 'suicide', 'HEART RACING', 'heartracing', 'endit all', 'no pointless',
+])
+def test_keyword_matcher_counts_like_count_keywords(text):
+    assert count_keyword_categories(text) == per_category(text)
+
+
+def test_keyword_matcher_overlaps():
+    # 'racing' inside 'heart racing' and 'end it' inside 'end it all' both count
+    assert count_keyword_categories('heart racing')[1] == 2
+    assert count_keyword_categories('end it all')[0] == 1
+    assert count_keyword_categories('end it all')[2] == 1
+    # 'suicide' is both a depression and a suicidal keyword
+    assert count_keyword_categories('suicide') == (1, 0, 1)
+
+
+def test_keyword_matcher_on_random_text():
+    rng = random.Random(1)
+    for _ in range(2000):
+        text = make_text(rng, rng.randint(1, 40), 0.3)
+        assert count_keyword_categories(text) == per_category(text)
+
+
+def test_keyword_matcher_with_shared_prefixes_and_empty_keyword():
+    matcher = KeywordMatcher({'a': ['ab', 'abc', 'b'], 'b': ['abcd', 'c', ''], 'c': []})
+    for text in ['', 'abcd', 'xabcx', 'ab c', 'bbb', 'dcba']:
+        assert matcher.count(text) == tuple(count_keywords(text, kws) for kws in (['ab', 'abc', 'b'],
+                                                                                   ['abcd', 'c', ''], []))
+
+
+def test_batch_analysis_matches_per_user_analysis():
+    rng = random.Random(2)
+    today = date(2026, 3, 1)
+    shared = make_text(rng, 20, 0.3)
+
+    def entry(days_ago, text=None):
+        return {'text': text or make_text(rng, rng.randint(1, 30), 0.3), 'date': str(today - timedelta(days=days_ago)),
+                'source': 'journal'}
+
+    cohort = {
+        'empty': [],
+        'only_old': [entry(15), entry(40)],
+        'undated': [{'text': 'i want to kill myself', 'date': 'Chat/Echo', 'source': 'echo'},
+                    {'text': 'sad and alone', 'source': 'echo'}],
+        'edge_of_window': [entry(14), entry(15), entry(0)],
+        'shared_a': [entry(1, shared), entry(2, shared)],
+        'shared_b': [entry(1, shared)],
+    }
+    for i in range(30):
+        cohort[f"user{i}"] = [entry(rng.randint(0, 30)) for _ in range(rng.randint(1, 25))]
+
+    batch = analyze_entries_batch(cohort, today=today)
+    assert list(batch) == list(cohort)
+    for user_id, entries in cohort.items():
+        assert batch[user_id] == analyze_entries(entries, today=today), user_id
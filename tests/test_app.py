@@ -0,0 +1,39 @@
+import pytest
+
+import app
+from jobs import MemoryJobStore, new_job
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(app, 'db', db)
+    return app.create_app(db_client=db).test_client()
+
+
+@pytest.fixture
+def job_store(monkeypatch):
+    store = MemoryJobStore()
+    monkeypatch.setattr(app.job_runner, '_store', store)
+    return store
+
+
+@pytest.mark.parametrize('limit', ['abc', '1.5', ''])
+def test_non_integer_limit_is_a_400(client, job_store, limit):
+    job = new_job('analyze_all', {})
+    job_store.create_job(job)
+    assert client.get(f'/debug/users?limit={limit}').status_code == 400
+    assert client.get(f"/jobs/{job['id']}/results?limit={limit}").status_code == 400
+
+
+def test_limit_is_clamped(client, job_store):
+    job = new_job('analyze_all', {})
+    job_store.create_job(job)
+    job_store.add_checkpoints(job['id'], [(f"u{i}", True, {'user_id': f"u{i}"}) for i in range(3)])
+    assert len(client.get(f"/jobs/{job['id']}/results?limit=-5").get_json()['results']) == 1
+    assert len(client.get(f"/jobs/{job['id']}/results?limit=2").get_json()['results']) == 2
+    assert client.get('/debug/users?limit=0').status_code == 200
+
+
+def test_non_integer_workers_is_a_400(client):
+    assert client.get('/debug/analyze-all?workers=x').status_code == 400
+    assert client.get('/debug/analyze-all?workers=0').status_code == 200
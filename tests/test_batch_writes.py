@@ -0,0 +1,54 @@
+import app
+from batch_writes import ResultWriter
+from benchmarks.corpus import generate_corpus
+from jobs import JobContext, MemoryJobStore, new_job
+
+
+def stored_results(db):
+    return sorted(path[1] for path in db.docs if path[2:3] == ('analysis_results',))
+
+
+def results_for(user_ids):
+    return [{'user_id': user_id, 'status': 'success', 'risk_level': 'low'} for user_id in user_ids]
+
+
+def test_commit_is_retried_without_duplicates(db):
+    db.fail_commits = 2
+    writer = ResultWriter(db, batch_size=10, retries=3, backoff=0)
+    writer.add_results(results_for(['u1', 'u2', 'u3']))
+    writer.flush()
+
+    assert writer.stats() == {'written': 3, 'batches': 1, 'retried_batches': 2, 'failed': 0}
+    assert stored_results(db) == ['u1', 'u2', 'u3']
+
+
+def test_batch_failing_every_attempt_is_reported_not_raised(db):
+    db.fail_commits = 3
+    writer = ResultWriter(db, batch_size=2, retries=1, backoff=0)
+    writer.add_results(results_for(['u1', 'u2', 'u3']) + [{'user_id': 'u4', 'status': 'no_data'}])
+    writer.flush()
+
+    # u1+u2 failed twice (first attempt and one retry); u3's batch got the third failure, then went through
+    assert writer.failed == ['u1', 'u2']
+    assert writer.stats() == {'written': 1, 'batches': 1, 'retried_batches': 2, 'failed': 2}
+    assert stored_results(db) == ['u3']
+
+
+def test_analyze_all_job_checkpoints_unsaved_users_as_not_persisted(db, monkeypatch):
+    generate_corpus(db, users=4, seed=1, journal_days=3, echo_messages=6)
+    monkeypatch.setattr(app, 'db', db)
+    monkeypatch.setattr(app, 'ANALYZE_BATCH_USERS', 2)
+    monkeypatch.setattr(app, 'result_writer', lambda: ResultWriter(db, batch_size=2, retries=1, backoff=0))
+    db.fail_commits = 2  # the first chunk's commit and its retry
+
+    store = MemoryJobStore()
+    job = new_job('analyze-all', {'persist': True, 'workers': 2})
+    store.create_job(job)
+    app.run_analyze_all_job(JobContext(store, store.get_job(job['id'])))
+
+    # Users are fetched concurrently, so which chunk came first varies
+    results = {r['user_id']: r for r in store.results(job['id'])}
+    unsaved = sorted(user_id for user_id, result in results.items() if result.get('persisted') is False)
+    assert len(results) == 4 and len(unsaved) == 2
+    assert stored_results(db) == sorted(set(results) - set(unsaved))
+    assert (store.get_job(job['id'])['done'], store.get_job(job['id'])['failed']) == (2, 2)
@@ -0,0 +1,54 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+import pytest
+
+from analyzer import WINDOW_DAYS
+from ingestion import fetch_cache, fetch_echo_window
+from queries import echo_ref, user_echo_query
+
+TODAY = date(2026, 3, 1)
+
+
+def seed(db, days, messages_per_day=10):
+    """`days` of history before TODAY, alternating user and bot messages"""
+    noon = datetime.combine(TODAY, time(12), tzinfo=timezone.utc)
+    for day in range(days):
+        for i in range(messages_per_day):
+            echo_ref(db, 'u1').document(f"{day}-{i}").set({
+                'sender': 'user' if i % 2 == 0 else 'bot',
+                'text': f"message {i} about my day",
+                'timestamp': noon - timedelta(days=day, minutes=i),
+                'metadata': {'model': 'echo', 'tokens': 42},
+            })
+
+
+@pytest.mark.parametrize('days', [14, 90, 365])
+def test_window_query_reads_only_user_messages_in_the_window(db, days):
+    seed(db, days)
+    db.reset_counters()
+    docs = list(user_echo_query(db, 'u1', today=TODAY).stream())
+
+    assert db.reads == len(docs) == min(days, WINDOW_DAYS + 1) * 5
+    assert all(set(doc.to_dict()) <= {'text', 'timestamp'} for doc in docs)
+
+
+def test_window_fetch_is_cached(db):
+    seed(db, 365)
+    db.reset_counters()
+    window = fetch_echo_window(db, 'u1', TODAY)
+    assert db.reads == len(window) == (WINDOW_DAYS + 1) * 5
+
+    db.reset_counters()
+    assert fetch_echo_window(db, 'u1', TODAY) == window
+    assert db.reads == 0
+
+
+def test_fetch_after_the_mark_reads_only_newer_messages(db):
+    seed(db, 365)
+    mark = datetime.combine(TODAY, time(12), tzinfo=timezone.utc) - timedelta(days=1)
+    fetch_cache.clear()
+    db.reset_counters()
+    newer = fetch_echo_window(db, 'u1', TODAY, after=mark)
+
+    # Yesterday's message at the mark (inclusive) and today's five
+    assert db.reads == len(newer) == 6
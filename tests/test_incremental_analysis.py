@@ -0,0 +1,118 @@
+import random
+from datetime import date, datetime, time, timedelta, timezone
+
+import pytest
+
+from analysis_state import run_incremental_analysis, save_state
+from analyzer import WINDOW_DAYS, analyze_entries
+from benchmarks.corpus import make_text
+from ingestion import read_change_markers, user_entries
+from queries import echo_ref, logs_ref
+
+START = date(2026, 1, 1)
+LEVEL_FIELDS = ('status', 'depression_level', 'anxiety_level', 'risk_level', 'negative_days',
+                'total_days_analyzed', 'crisis_detected')
+
+
+def write_day(db, rng, day, journals=1, messages=3, keyword_rate=0.2):
+    """One day of activity: journals in the logs document, user and bot echo messages"""
+    logs_ref(db, 'u1').set(
+        {str(day): {'journals': [{'text': make_text(rng, 30, keyword_rate)} for _ in range(journals)]}}, merge=True)
+    noon = datetime.combine(day, time(12), tzinfo=timezone.utc)
+    for i in range(messages):
+        echo_ref(db, 'u1').document(f"{day}-{i}").set({
+            'sender': 'user' if i % 3 else 'bot',
+            'text': make_text(rng, 12, keyword_rate),
+            'timestamp': noon + timedelta(minutes=i),
+        })
+
+
+def analyze(db, today, full=False):
+    """One /analyze run on `today`: invalidate by change markers, analyze, store the state"""
+    read_change_markers(db, 'u1', today)
+    results, state = run_incremental_analysis(db, 'u1', full=full, today=today)
+    save_state(db, 'u1', state)
+    return results
+
+
+def rebuilt(db, today):
+    """What /debug/analyze-all computes from scratch for the same day"""
+    entries = list(user_entries(db, 'u1', today))
+    return entries, analyze_entries(entries, today=today)
+
+
+@pytest.mark.parametrize('step', [1, 3, 5])
+def test_incremental_matches_full_rebuild_across_window_rollover(db, step):
+    rng = random.Random(step)
+    today = START
+    for _ in range(3 * WINDOW_DAYS // step):
+        write_day(db, rng, today)
+        results = analyze(db, today)
+        entries, expected = rebuilt(db, today)
+
+        assert {k: results[k] for k in LEVEL_FIELDS} == {k: expected[k] for k in LEVEL_FIELDS}
+        assert results['total_entries'] == len(entries)
+        today += timedelta(days=step)
+
+
+def test_no_data_once_everything_left_the_window(db):
+    rng = random.Random(0)
+    for offset in range(5):
+        write_day(db, rng, START + timedelta(days=offset))
+        assert analyze(db, START + timedelta(days=offset))['status'] == 'success'
+
+    later = START + timedelta(days=WINDOW_DAYS + 10)
+    assert rebuilt(db, later)[0] == []
+    assert analyze(db, later) is None
+    assert analyze(db, later, full=True) is None
+
+
+def assert_matches_rebuild(results, db, today):
+    entries, expected = rebuilt(db, today)
+    assert {k: results[k] for k in LEVEL_FIELDS} == {k: expected[k] for k in LEVEL_FIELDS}
+    assert results['total_entries'] == len(entries)
+
+
+def test_backfilled_echo_message_below_the_mark_is_scored(db):
+    rng = random.Random(1)
+    write_day(db, rng, START, keyword_rate=0)
+    assert not analyze(db, START)['crisis_detected']
+
+    # Synced from an offline device: older than everything already scored
+    echo_ref(db, 'u1').document('offline-1').set({
+        'sender': 'user', 'text': 'i want to kill myself',
+        'timestamp': datetime.combine(START, time(9), tzinfo=timezone.utc),
+    })
+    results = analyze(db, START)
+    assert results['crisis_detected']
+    assert_matches_rebuild(results, db, START)
+
+
+def test_echo_message_tied_with_the_mark_is_scored_once(db):
+    rng = random.Random(2)
+    write_day(db, rng, START, keyword_rate=0)
+    analyze(db, START)
+
+    mark = datetime.combine(START, time(12), tzinfo=timezone.utc) + timedelta(minutes=2)
+    echo_ref(db, 'u1').document('same-second').set({'sender': 'user', 'text': 'i want to end it all',
+                                                    'timestamp': mark})
+    results = analyze(db, START)
+    assert results['crisis_detected']
+    assert_matches_rebuild(results, db, START)
+    # Nothing new: the tied messages are not added a second time
+    assert_matches_rebuild(analyze(db, START), db, START)
+
+
+def test_deleted_echo_message_leaves_the_state(db):
+    rng = random.Random(3)
+    write_day(db, rng, START, keyword_rate=0)
+    echo_ref(db, 'u1').document('regret').set({
+        'sender': 'user', 'text': 'i want to kill myself',
+        'timestamp': datetime.combine(START, time(8), tzinfo=timezone.utc),
+    })
+    assert analyze(db, START)['crisis_detected']
+
+    echo_ref(db, 'u1').document('regret').delete()
+    results = analyze(db, START)
+    assert not results['crisis_detected']
+    assert_matches_rebuild(results, db, START)
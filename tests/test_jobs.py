@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from jobs import JobRunner, MemoryJobStore, SQLiteJobStore, new_job
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    return MemoryJobStore() if request.param == 'memory' else SQLiteJobStore(str(tmp_path / 'jobs.db'))
+
+
+@pytest.fixture
+def make_runner(store):
+    runners = []
+
+    def make(**kwargs):
+        runner = JobRunner(store, poll_interval=0.05, **kwargs)
+        runners.append(runner)
+        return runner
+
+    yield make
+    for runner in runners:
+        runner.stop()
+
+
+def wait_for(store, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get_job(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {store.get_job(job_id)['status']}, not {status}")
+
+
+def test_failed_job_resumes_after_its_last_checkpoint(store, make_runner):
+    runs, fail_at = [], ['c']
+
+    def handler(ctx):
+        items = ['a', 'b', 'c', 'd']
+        ctx.set_total(len(items))
+        for item in items:
+            if item in ctx.completed:
+                continue
+            if item in fail_at:
+                fail_at.remove(item)
+                raise RuntimeError('worker lost')
+            runs.append(item)
+            ctx.checkpoint([(item, True, {'item': item})])
+
+    runner = make_runner()
+    runner.register('letters', handler)
+    job_id = runner.submit('letters')
+    job = wait_for(store, job_id, 'failed')
+    assert (job['done'], job['error']) == (2, 'worker lost')
+
+    assert runner.resume(job_id)
+    job = wait_for(store, job_id, 'completed')
+    assert runs == ['a', 'b', 'c', 'd']
+    assert (job['done'], job['failed'], job['run_start_count']) == (4, 0, 2)
+    assert [r['item'] for r in store.results(job_id)] == ['a', 'b', 'c', 'd']
+    assert not runner.resume(job_id)
+
+
+def test_running_job_is_claimed_once_until_its_heartbeat_goes_stale(store):
+    job = new_job('letters', {})
+    store.create_job(job)
+    assert store.claim(job['id'], 'worker-1', stale_after=60)
+    assert not store.claim(job['id'], 'worker-2', stale_after=60)
+    assert store.claimable_jobs(stale_after=60) == []
+
+    store.update_job(job['id'], heartbeat_at=time.time() - 120)
+    assert store.claimable_jobs(stale_after=60) == [job['id']]
+    assert store.claim(job['id'], 'worker-2', stale_after=60)
+    assert store.get_job(job['id'])['owner'] == 'worker-2'
+
+
+def test_slow_item_keeps_heartbeating(store, make_runner):
+    claimed_meanwhile = []
+
+    def handler(ctx):
+        # One item, no checkpoint, several times longer than stale_after
+        time.sleep(0.5)
+        claimed_meanwhile.append(store.claim(ctx.job_id, 'other-worker', stale_after=0.2))
+
+    runner = make_runner(stale_after=0.2, heartbeat_interval=0.05)
+    runner.register('slow', handler)
+    job = wait_for(store, runner.submit('slow'), 'completed')
+    assert claimed_meanwhile == [False]
+    assert job['owner'] != 'other-worker'
@@ -0,0 +1,49 @@
+from datetime import date
+
+from analysis_state import run_incremental_analysis
+from analyzer import SUICIDAL_KEYWORDS
+from ingestion import fetch_cache, fetch_journal_window, journal_texts
+from migrate_logs import migrate_user
+from queries import journal_month_ref, logs_ref
+
+TODAY = date(2026, 3, 10)
+DAY = str(TODAY)
+CRISIS_TEXT = f"i keep thinking about {SUICIDAL_KEYWORDS[0]}"
+
+
+def write_journal(db, text, day=DAY):
+    """What clients do: append to the day in the legacy logs document"""
+    doc = logs_ref(db, 'u1').get()
+    days = doc.to_dict() if doc.exists else {}
+    journals = (days.get(day) or {}).get('journals', [])
+    logs_ref(db, 'u1').set({day: {'journals': journals + [{'text': text}]}}, merge=True)
+
+
+def window_texts(db):
+    fetch_cache.clear()
+    return sorted(journal_texts(fetch_journal_window(db, 'u1', TODAY).get(DAY)))
+
+
+def test_legacy_write_after_migration_is_read(db):
+    write_journal(db, 'a quiet morning walk')
+    migrate_user(db, 'u1', delete_source=True)
+    assert DAY not in logs_ref(db, 'u1').get().to_dict()
+
+    write_journal(db, CRISIS_TEXT)
+
+    assert window_texts(db) == ['a quiet morning walk', CRISIS_TEXT]
+    results, _ = run_incremental_analysis(db, 'u1', today=TODAY)
+    assert results['crisis_detected']
+    assert results['total_entries'] == 2
+
+
+def test_remigration_unions_journals_without_duplicates(db):
+    write_journal(db, 'first entry')
+    migrate_user(db, 'u1', delete_source=True)
+    write_journal(db, 'second entry')
+    migrate_user(db, 'u1')
+
+    shard = journal_month_ref(db, 'u1', DAY[:7]).get().to_dict()
+    assert journal_texts(shard[DAY]) == ['first entry', 'second entry']
+    # Still in both layouts (not deleted this time): read once, not twice
+    assert window_texts(db) == ['first entry', 'second entry']
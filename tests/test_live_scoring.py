@@ -0,0 +1,60 @@
+from datetime import datetime, time, timezone
+
+import app
+from analysis_state import load_latest, run_incremental_analysis, state_ref
+from live_scoring import message_date, score_new_message
+from queries import echo_ref
+
+CALM = 'today i went to work and talked with my friend it was really nice'
+
+
+def write_messages(db, texts):
+    noon = datetime.combine(datetime.now(timezone.utc).date(), time(0), tzinfo=timezone.utc)
+    for i, text in enumerate(texts):
+        echo_ref(db, 'u1').document(f"m{i}").set({'sender': 'user', 'text': text, 'timestamp': noon})
+
+
+def test_live_score_landing_during_analysis_is_kept(db, monkeypatch):
+    monkeypatch.setattr(app, 'db', db)
+    write_messages(db, [CALM, CALM])
+    results, state = run_incremental_analysis(db, 'u1')
+    assert not results['crisis_detected']
+
+    # Scored after the analysis read its data, before it is persisted
+    assert score_new_message(db, 'u1', 'i want to kill myself')['crisis_detected']
+
+    results, _ = app.finalize_analysis('u1', results, state)
+    app.persist_analysis('u1', results, state)
+
+    stored = state_ref(db, 'u1').get().to_dict()
+    assert sum(day['sentiment_count'] for day in stored['live_days'].values()) == 1
+    assert load_latest(db, 'u1')['result']['crisis_detected']
+
+
+def test_analysis_clears_the_live_scores_it_covers(db, monkeypatch):
+    monkeypatch.setattr(app, 'db', db)
+    write_messages(db, [CALM])
+    score_new_message(db, 'u1', CALM)
+
+    results, state = run_incremental_analysis(db, 'u1')
+    results, _ = app.finalize_analysis('u1', results, state)
+    app.persist_analysis('u1', results, state)
+
+    assert state_ref(db, 'u1').get().to_dict()['live_days'] == {}
+    assert load_latest(db, 'u1')['result']['total_entries'] == 1
+
+
+def test_score_rejects_bad_input_with_400(db, monkeypatch):
+    monkeypatch.setattr(app, 'db', db)
+    client = app.create_app(db_client=db).test_client()
+    assert client.post('/score', json={'user_id': 42, 'text': 'hello'}).status_code == 400
+    assert client.post('/score', json={'user_id': 'u1', 'text': 'hello', 'timestamp': 1700000000}).status_code == 400
+    assert client.post('/score', json={'user_id': 'u1', 'text': 'hello', 'date': '17/10/2026'}).status_code == 400
+    assert client.post('/score', json={'user_id': 'u1', 'text': CALM}).status_code == 200
+
+
+def test_message_date_is_the_utc_day():
+    assert str(message_date('2026-03-01T23:30:00-05:00')) == '2026-03-02'
+    assert str(message_date('2026-03-02T01:00:00+09:00')) == '2026-03-01'
+    assert str(message_date('2026-03-01T23:30:00')) == '2026-03-01'
+    assert str(message_date(date='2026-03-01')) == '2026-03-01'
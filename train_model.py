@@ -1,156 +1,378 @@
-import pandas as pd
-import numpy as np
-import re
+import argparse
+import os
 import pickle
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
-from sklearn.metrics import accuracy_score, classification_report
-import nltk
-from nltk.corpus import stopwords
+import re
+import resource
+import time
+import zlib
+from multiprocessing import Pool
 
-# Download stopwords
-nltk.download('stopwords')
-stop_words = set(stopwords.words('english'))
+import numpy as np
 
-# ===== STEP 1: LOAD DATA =====
-print("📂 Loading dataset...")
+import model_registry
 
 # Dataset has 6 columns: [target, id, date, flag, user, text]
 # target: 0 = negative, 4 = positive
 columns = ['target', 'id', 'date', 'flag', 'user', 'text']
 
-df = pd.read_csv('C:\\Users\\Home\\Documents\\Projects\\liberate-me\\Dataset\\training.1600000.processed.noemoticon.csv', 
-                 encoding='latin-1', 
-                 names=columns)
+stop_words = set()
+
+URL_RE = re.compile(r'http\S+|www\S+|https\S+')
+MENTION_RE = re.compile(r'@\w+|#\w+')
+NON_ALPHA_RE = re.compile(r'[^a-zA-Z\s]')
 
-print(f"✅ Loaded {len(df)} tweets")
 
-# Take a sample for faster training (optional - remove for full training)
-# df = df.sample(n=100000, random_state=42)  # Use 100k for testing
-# For production: use all 1.6M
+def load_stopwords():
+    """Download (if needed) and load the NLTK English stopwords"""
+    global stop_words
+    import nltk
+    from nltk.corpus import stopwords
+    nltk.download('stopwords', quiet=True)
+    stop_words = set(stopwords.words('english'))
+    return stop_words
 
-# ===== STEP 2: PREPROCESS TEXT =====
-print("🧹 Cleaning text...")
 
 def preprocess_text(text):
     """Clean tweet text"""
     # Lowercase
     text = text.lower()
-    
-    # Remove URLs
-    text = re.sub(r'http\S+|www\S+|https\S+', '', text)
-    
-    # Remove mentions and hashtags
-    text = re.sub(r'@\w+|#\w+', '', text)
-    
-    # Remove special characters and numbers
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    
-    # Remove extra spaces
-    text = ' '.join(text.split())
-    
-    # Remove stopwords
-    text = ' '.join([word for word in text.split() if word not in stop_words])
-    
-    return text
-
-df['clean_text'] = df['text'].apply(preprocess_text)
-
-# Remove empty tweets
-df = df[df['clean_text'].str.len() > 0]
-
-print(f"✅ Cleaned {len(df)} tweets")
-
-# ===== STEP 3: PREPARE DATA =====
-print("🔢 Preparing data...")
-
-# Convert target: 0 stays 0 (negative), 4 becomes 1 (positive)
-df['sentiment'] = df['target'].apply(lambda x: 0 if x == 0 else 1)
-
-X = df['clean_text']
-y = df['sentiment']
-
-# Split data: 80% train, 20% test
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
 
-print(f"📊 Training samples: {len(X_train)}")
-print(f"📊 Testing samples: {len(X_test)}")
-
-# ===== STEP 4: VECTORIZE TEXT =====
-
-
-vectorizer = TfidfVectorizer(
-    max_features=5000,  # Use top 5000 words
-    ngram_range=(1, 2),  # Use unigrams and bigrams
-    min_df=5,  # Ignore words that appear in less than 5 documents
-)
-
-X_train_vec = vectorizer.fit_transform(X_train)
-X_test_vec = vectorizer.transform(X_test)
-
-print(f"✅ Vocabulary size: {len(vectorizer.vocabulary_)}")
-
-# ===== STEP 5: TRAIN SVM MODEL =====
-print("🧠 Training SVM model (this will take several minutes)...")
-
-model = LinearSVC(
-    random_state=42,
-    max_iter=1000,
-    C=1.0
-)
-
-model.fit(X_train_vec, y_train)
-
-print("✅ Model trained!")
-
-# ===== STEP 6: EVALUATE MODEL =====
-print("📈 Evaluating model...")
-
-y_pred = model.predict(X_test_vec)
-accuracy = accuracy_score(y_test, y_pred)
-
-print(f"\n🎯 Accuracy: {accuracy * 100:.2f}%")
-print("\n📊 Classification Report:")
-print(classification_report(y_test, y_pred, target_names=['Negative', 'Positive']))
+    # Remove URLs
+    text = URL_RE.sub('', text)
 
-# ===== STEP 7: SAVE MODEL =====
-print("💾 Saving model...")
+    # Remove mentions and hashtags
+    text = MENTION_RE.sub('', text)
 
-# Create models directory
-import os
-os.makedirs('models', exist_ok=True)
-
-# Save model
-with open('models/svm_model.pkl', 'wb') as f:
-    pickle.dump(model, f)
-
-# Save vectorizer
-with open('models/vectorizer.pkl', 'wb') as f:
-    pickle.dump(vectorizer, f)
-
-print("✅ Model saved to models/svm_model.pkl")
-print("✅ Vectorizer saved to models/vectorizer.pkl")
-
-# ===== STEP 8: TEST MODEL =====
-print("\n🧪 Testing with sample texts...")
-
-test_texts = [
-    "I'm feeling really happy today!",
-    "I hate everything, life is terrible",
-    "Just another normal day",
-    "I feel so worthless and alone",
-    "Everything is amazing, best day ever!"
-]
-
-for text in test_texts:
-    clean = preprocess_text(text)
-    vec = vectorizer.transform([clean])
-    pred = model.predict(vec)[0]
-    sentiment = "POSITIVE" if pred == 1 else "NEGATIVE"
-    print(f"Text: {text}")
-    print(f"Prediction: {sentiment}\n")
-
-print("TRAINING COMPLETE!")
\ No newline at end of file
+    # Remove special characters and numbers
+    text = NON_ALPHA_RE.sub('', text)
+
+    # Remove extra spaces and stopwords
+    return ' '.join([word for word in text.split() if word not in stop_words])
+
+
+def clean_batch(texts):
+    """Clean a batch of texts (runs inside pool workers)"""
+    return [preprocess_text(t) for t in texts]
+
+
+def init_worker(words):
+    global stop_words
+    stop_words = words
+
+
+def clean_parallel(pool, texts, batch_size=10000):
+    """Clean texts across the pool, keeping input order"""
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    return [t for batch in pool.map(clean_batch, batches) for t in batch]
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its (finished) worker processes, in MB"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+def report(accuracy, started):
+    own, children = peak_rss_mb()
+    print(f"\n🎯 Accuracy: {accuracy * 100:.2f}%")
+    print(f"⏱️ Wall time: {time.perf_counter() - started:.1f}s")
+    print(f"🧮 Peak RSS: {own:.0f} MB (largest worker: {children:.0f} MB)")
+
+
+def save_models(model, vectorizer, output_dir):
+    """Pickle model + vectorizer, and export the compact linear format when possible"""
+    print("💾 Saving model...")
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, 'svm_model.pkl')
+    vectorizer_path = os.path.join(output_dir, 'vectorizer.pkl')
+    linear_path = os.path.join(output_dir, 'linear_model.bin')
+
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
+    with open(vectorizer_path, 'wb') as f:
+        pickle.dump(vectorizer, f)
+    print(f"✅ Model saved to {model_path}")
+    print(f"✅ Vectorizer saved to {vectorizer_path}")
+
+    # Compact scoring artifact: memory-mapped by analyzer.py, no sklearn needed at serve time
+    from analyzer import export_linear_model, model_version
+    try:
+        export_linear_model(vectorizer, model, linear_path, version=model_version(model_path, vectorizer_path))
+        print(f"✅ Linear scoring export saved to {linear_path}")
+    except (AttributeError, ValueError) as e:
+        # e.g. HashingVectorizer has no vocabulary; never leave a stale export next to new pickles
+        if os.path.exists(linear_path):
+            os.remove(linear_path)
+        print(f"⚠️ No linear export for this model ({e}); analyzer will load the pickles")
+
+
+def register_models(args, accuracy, seconds):
+    """Publish the saved artifacts as a registry version; --activate also makes it CURRENT"""
+    from analyzer import model_version
+    version = model_version(os.path.join(args.output_dir, 'svm_model.pkl'),
+                            os.path.join(args.output_dir, 'vectorizer.pkl'))
+    metrics = {
+        'accuracy': round(float(accuracy), 4),
+        'mode': args.mode,
+        'data': os.path.basename(args.data),
+        'sample': args.sample,
+        'epochs': args.epochs,
+        'training_seconds': round(seconds, 1),
+    }
+    try:
+        model_registry.publish(args.output_dir, version, metrics, registry_dir=args.registry_dir)
+        print(f"✅ Registered model version {version} in {args.registry_dir}")
+    except ValueError as e:
+        print(f"⚠️ {e}")
+    if args.activate:
+        model_registry.set_current(version, args.registry_dir)
+        print(f"✅ {version} is now CURRENT (running servers pick it up within MODEL_WATCH_INTERVAL)")
+
+
+# ===== IN-MEMORY TRAINING (TF-IDF + LinearSVC) =====
+def train_in_memory(args, pool):
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.svm import LinearSVC
+    from sklearn.metrics import accuracy_score, classification_report
+
+    # ===== STEP 1: LOAD DATA =====
+    print("📂 Loading dataset...")
+    df = pd.read_csv(args.data, encoding='latin-1', names=columns)
+    print(f"✅ Loaded {len(df)} tweets")
+
+    # Take a sample for faster training (optional)
+    if args.sample:
+        df = df.sample(n=min(args.sample, len(df)), random_state=42)
+
+    # ===== STEP 2: PREPROCESS TEXT =====
+    print("🧹 Cleaning text...")
+    df['clean_text'] = clean_parallel(pool, df['text'].astype(str).tolist())
+
+    # Remove empty tweets
+    df = df[df['clean_text'].str.len() > 0]
+
+    print(f"✅ Cleaned {len(df)} tweets")
+
+    # ===== STEP 3: PREPARE DATA =====
+    print("🔢 Preparing data...")
+
+    # Convert target: 0 stays 0 (negative), 4 becomes 1 (positive)
+    df['sentiment'] = (df['target'] != 0).astype(int)
+
+    X = df['clean_text']
+    y = df['sentiment']
+
+    # Split data: 80% train, 20% test
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42
+    )
+
+    print(f"📊 Training samples: {len(X_train)}")
+    print(f"📊 Testing samples: {len(X_test)}")
+
+    # ===== STEP 4: VECTORIZE TEXT =====
+    vectorizer = TfidfVectorizer(
+        max_features=5000,  # Use top 5000 words
+        ngram_range=(1, 2),  # Use unigrams and bigrams
+        min_df=5,  # Ignore words that appear in less than 5 documents
+    )
+
+    X_train_vec = vectorizer.fit_transform(X_train)
+    X_test_vec = vectorizer.transform(X_test)
+
+    print(f"✅ Vocabulary size: {len(vectorizer.vocabulary_)}")
+
+    # ===== STEP 5: TRAIN SVM MODEL =====
+    print("🧠 Training SVM model (this will take several minutes)...")
+
+    model = LinearSVC(
+        random_state=42,
+        max_iter=1000,
+        C=1.0
+    )
+
+    model.fit(X_train_vec, y_train)
+
+    print("✅ Model trained!")
+
+    # ===== STEP 6: EVALUATE MODEL =====
+    print("📈 Evaluating model...")
+
+    y_pred = model.predict(X_test_vec)
+    accuracy = accuracy_score(y_test, y_pred)
+
+    print("\n📊 Classification Report:")
+    print(classification_report(y_test, y_pred, target_names=['Negative', 'Positive']))
+    return model, vectorizer, accuracy
+
+
+# ===== STREAMING TRAINING (HashingVectorizer + SGDClassifier.partial_fit) =====
+def shard_offsets(path, shards):
+    """Split the file into byte ranges that start at line boundaries"""
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, shards):
+            f.seek(size * i // shards)
+            f.readline()
+            starts.append(f.tell())
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def read_shard(path, start, end, chunksize):
+    """Yield DataFrame chunks of the CSV rows in [start, end)"""
+    import io
+    import pandas as pd
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            lines = []
+            while len(lines) < chunksize and f.tell() < end:
+                lines.append(f.readline())
+            yield pd.read_csv(io.BytesIO(b''.join(lines)), encoding='latin-1', names=columns)
+
+
+def interleaved_chunks(path, chunksize, shards):
+    """Chunks that mix rows from every shard.
+
+    Sentiment140 is sorted by label, so reading it front to back would feed
+    partial_fit hundreds of thousands of rows of one class. Reading several
+    evenly spaced shards in lockstep keeps every chunk class-mixed while only
+    `chunksize` rows are in memory.
+    """
+    import pandas as pd
+    readers = [read_shard(path, start, end, max(1, chunksize // shards))
+               for start, end in shard_offsets(path, shards)]
+    while readers:
+        parts = []
+        for reader in list(readers):
+            part = next(reader, None)
+            if part is None:
+                readers.remove(reader)
+            else:
+                parts.append(part)
+        if parts:
+            yield pd.concat(parts, ignore_index=True).sample(frac=1.0, random_state=42)
+
+
+def is_test_row(ids):
+    """Deterministic 20% holdout by tweet id (no need to keep a split in memory)"""
+    return np.array([zlib.crc32(str(i).encode()) % 5 == 0 for i in ids])
+
+
+def cleaned_chunks(args, pool):
+    """(clean_texts, labels, is_test) per chunk; cleaning of a whole chunk is spread over the pool"""
+    for chunk in interleaved_chunks(args.data, args.chunksize, args.shards):
+        texts = clean_parallel(pool, chunk['text'].astype(str).tolist(),
+                               batch_size=max(1, len(chunk) // args.workers + 1))
+        texts = np.array(texts, dtype=object)
+        labels = (chunk['target'].to_numpy() != 0).astype(int)
+        keep = np.array([len(t) > 0 for t in texts], dtype=bool)
+        yield texts[keep], labels[keep], is_test_row(chunk['id'].to_numpy())[keep]
+
+
+def train_streaming(args, pool):
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.metrics import classification_report
+
+    vectorizer = HashingVectorizer(
+        n_features=2 ** 20,
+        ngram_range=(1, 2),  # Use unigrams and bigrams
+        alternate_sign=False,
+        norm='l2',
+    )
+    # hinge loss = linear SVM, fitted by SGD one chunk at a time
+    model = SGDClassifier(loss='hinge', alpha=1e-5, random_state=42)
+
+    print(f"🧠 Streaming training: {args.epochs} epoch(s), {args.chunksize} rows/chunk, {args.shards} shards")
+    for epoch in range(args.epochs):
+        seen = 0
+        for texts, labels, test in cleaned_chunks(args, pool):
+            train = ~test
+            if train.any():
+                model.partial_fit(vectorizer.transform(texts[train]), labels[train], classes=[0, 1])
+                seen += int(train.sum())
+        print(f"✅ Epoch {epoch + 1}: trained on {seen} tweets")
+
+    # ===== EVALUATE (second pass over the holdout rows only) =====
+    print("📈 Evaluating model...")
+    confusion = np.zeros((2, 2), dtype=np.int64)
+    for texts, labels, test in cleaned_chunks(args, pool):
+        if test.any():
+            pred = model.predict(vectorizer.transform(texts[test]))
+            np.add.at(confusion, (labels[test], pred), 1)
+
+    accuracy = np.trace(confusion) / max(1, confusion.sum())
+    y_true = np.repeat([0, 0, 1, 1], confusion.ravel())
+    y_pred = np.repeat([0, 1, 0, 1], confusion.ravel())
+    print("\n📊 Classification Report:")
+    print(classification_report(y_true, y_pred, target_names=['Negative', 'Positive']))
+    return model, vectorizer, accuracy
+
+
+# ===== TEST MODEL =====
+def smoke_test(model, vectorizer):
+    print("\n🧪 Testing with sample texts...")
+
+    test_texts = [
+        "I'm feeling really happy today!",
+        "I hate everything, life is terrible",
+        "Just another normal day",
+        "I feel so worthless and alone",
+        "Everything is amazing, best day ever!"
+    ]
+
+    for text in test_texts:
+        clean = preprocess_text(text)
+        vec = vectorizer.transform([clean])
+        pred = model.predict(vec)[0]
+        sentiment = "POSITIVE" if pred == 1 else "NEGATIVE"
+        print(f"Text: {text}")
+        print(f"Prediction: {sentiment}\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the sentiment model on Sentiment140")
+    parser.add_argument('data', help="path to training.1600000.processed.noemoticon.csv")
+    parser.add_argument('--mode', choices=['memory', 'streaming'], default='memory',
+                        help="memory: TF-IDF + LinearSVC on the full frame (default); "
+                             "streaming: chunked HashingVectorizer + SGD, bounded memory")
+    parser.add_argument('--output-dir', default='models')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processes used for text cleaning")
+    parser.add_argument('--sample', type=int, default=0, help="memory mode: train on a random sample of N rows")
+    parser.add_argument('--chunksize', type=int, default=100000, help="streaming mode: rows per partial_fit")
+    parser.add_argument('--shards', type=int, default=16, help="streaming mode: file regions read in lockstep")
+    parser.add_argument('--epochs', type=int, default=1, help="streaming mode: passes over the data")
+    parser.add_argument('--register', action='store_true', help="publish the model as a new registry version")
+    parser.add_argument('--activate', action='store_true', help="with --register: make it the served version")
+    parser.add_argument('--registry-dir', default=model_registry.REGISTRY_DIR,
+                        help="default: MODEL_REGISTRY_DIR, else models/registry next to the app (where it serves from)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    words = load_stopwords()
+
+    with Pool(args.workers, initializer=init_worker, initargs=(words,)) as pool:
+        if args.mode == 'streaming':
+            model, vectorizer, accuracy = train_streaming(args, pool)
+        else:
+            model, vectorizer, accuracy = train_in_memory(args, pool)
+
+    report(accuracy, started)
+    save_models(model, vectorizer, args.output_dir)
+    smoke_test(model, vectorizer)
+    if args.register:
+        register_models(args, accuracy, time.perf_counter() - started)
+    print("TRAINING COMPLETE!")
+
+
+if __name__ == '__main__':
+    main()
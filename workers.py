@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def bounded_map(fn, items, max_workers=8):
+    """Run fn over items on a thread pool, yielding results as each one finishes.
+
+    At most 2 * max_workers items are in flight, so `items` can be a lazy
+    iterator of any length without everything being queued up front. Results
+    come back in completion order, not input order. fn should handle its own
+    errors; an exception raised by fn is re-raised here.
+    """
+    max_workers = max(1, int(max_workers))
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        for item in items:
+            pending.add(pool.submit(fn, item))
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
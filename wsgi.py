@@ -0,0 +1,9 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py
+
+Importing this module loads the models (via app -> analyzer). With preload_app
+the master does that once and workers share the pages copy-on-write; each
+worker opens its own Firestore client in the post_fork hook.
+"""
+from app import create_app
+
+app = create_app(connect_db=False)